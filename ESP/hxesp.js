@@ -28,6 +28,16 @@ window.gp = {
             gp.dom.buildButton.disabled = false
             window.oldactivateBuildButton()
           },
+        // layout unchanged: set changed parameters without a rebuild
+        setpmtrs: function(values) {
+          for (var i=0; i < pmtr.length; i++) {
+            var value = values[pmtr[i].name]
+            if (value === undefined || Number(value) == pmtr[i].value[0])
+              continue
+            pmtr[i].value[0] = Number(value)
+            browserToServer("setPmtr|"+pmtr[i].name+"|1|1|"+value+"|")
+          }
+        },
         },
 
   awaiting_response: false,
@@ -44,9 +54,14 @@ window.gp = {
 
     console.log(gp.sol)
     gp.websocket.send(JSON.stringify(gp.sol))
+    gp.dom.cancelButton.style.display = null
     // gp.websocket.send("sol")
   },
 
+  cancel: function() {
+    gp.websocket.send(JSON.stringify({type: "cancel"}))
+  },
+
   websocket: new WebSocket("ws://"+url+"/")
 }
 
@@ -56,10 +71,34 @@ gp.websocket.onmessage = function(evt) {
   console.log("Data received:", data)
   postMessage("GP: " + data.msg)
   console.log(data.status)
+  if (data.status != "progress" && data.status != "estimate"
+      && data.status != "solving" && data.status != "pong")
+    gp.dom.cancelButton.style.display = "none"
   if (data.status == "optimal") {
     gp.dom.optimizeButton.innerText = "Optimized"
     gp.dom.optimizeButton.style.backgroundColor = null
-    gp.esp.update()
+    if (data.csm && data.csm != wv.filename) {
+      // another session's file (non-blocking server): open it on rebuild
+      wv.filename = data.csm
+      gp.esp.update()
+    } else if (data.geometry === false)
+      gp.esp.setpmtrs(data.pmtrs)
+    else
+      gp.esp.update()
+  } else if (data.status == "progress") {
+    gp.dom.optimizeButton.innerText = ("Iteration " + data.iteration + ": "
+                                       + data.Q.toFixed(1) + " W ("
+                                       + data.elapsed.toFixed(0) + " s)")
+  } else if (data.status == "saved") {
+    // solution files written on request
+  } else if (data.status == "cancelled") {
+    gp.dom.optimizeButton.innerText = "Cancelled"
+    gp.dom.optimizeButton.style.backgroundColor = null
+  } else if (data.status == "estimate") {
+    // first-order prediction; the exact solution follows
+    gp.dom.optimizeButton.innerText = "~" + data.Q.toFixed(1) + " W, optimizing..."
+  } else if (["solving", "queued", "idle", "pong"].indexOf(data.status) >= 0) {
+    // informational messages from the non-blocking server
   } else {
     gp.dom.optimizeButton.innerText = "Error"
     gp.dom.optimizeButton.style.backgroundColor = "#FF3F3F"
@@ -86,3 +125,11 @@ gp.dom.optimizeButton.type = "button"
 gp.dom.optimizeButton.innerText = "Optimized"
 gp.dom.optimizeButton.onclick = gp.sendpmtrs
 gp.dom.buttonForm.insertBefore(gp.dom.optimizeButton, gp.dom.buildButton)
+
+gp.dom.cancelButton = document.createElement("button")
+gp.dom.cancelButton.id = "cancelButton"
+gp.dom.cancelButton.type = "button"
+gp.dom.cancelButton.innerText = "Cancel"
+gp.dom.cancelButton.style.display = "none"
+gp.dom.cancelButton.onclick = gp.cancel
+gp.dom.buttonForm.insertBefore(gp.dom.cancelButton, gp.dom.buildButton)
@@ -0,0 +1,179 @@
+"""Fits the drela_derived correlations and generates their RectangularPipe
+constraints (heatexchanger/correlations.py)
+
+Every correlation is fitted with each K in KS and fit type in TYPES, in a
+process pool, and the fit with the lowest RMS error is kept. Fits are
+cached in .fitcache/, keyed by a hash of the CSV contents and the fit
+settings, so only changed data (or fits that failed) is refitted.
+"""
+import os
+import json
+from hashlib import sha1
+from pprint import pformat
+from collections import OrderedDict
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from gpfit.fit import fit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# fitted quantity -> (csv file, x column, y column)
+CORRELATIONS = OrderedDict([("eta_h", ("etahFit.csv", "Re", "etah")),
+                            ("Pf", ("PfFit.csv", "Re", "Pf"))])
+KS = [1, 2, 3]
+TYPES = ["MA", "SMA", "ISMA"]
+CACHEDIR = os.path.join(HERE, ".fitcache")
+MODULE = os.path.join(HERE, "..", "heatexchanger", "correlations.py")
+
+
+def csv_digest(csvfile):
+    with open(os.path.join(HERE, csvfile), "rb") as f:
+        return sha1(f.read()).hexdigest()
+
+
+def terms(cstrt):
+    """The posynomials p <= 1 of a gpfit constraint, as [(c, a, b)] terms
+
+    Each term is c*u**a*w**b, u being the fit's input and w its output.
+    """
+    if isinstance(cstrt, (list, tuple)):
+        return [p for c in cstrt for p in terms(c)]
+    if hasattr(cstrt, "flat"):
+        return [p for c in cstrt.flat(constraintsets=False)
+                for p in terms(c)]
+    posys = []
+    for p in cstrt.as_posyslt1():
+        posy = []
+        for c, exp in zip(p.cs, p.exps):
+            a = sum(x for key, x in exp.items() if key.name != "w")
+            b = sum(x for key, x in exp.items() if key.name == "w")
+            posy.append((float(c), float(a), float(b)))
+        posys.append(posy)
+    return posys
+
+
+def fit_one(task):
+    "Fits one correlation with one K and type, or loads the cached fit"
+    name, csvfile, xcol, ycol, digest, K, ftype = task
+    path = os.path.join(CACHEDIR, "%s_%i_%s.json" % (digest, K, ftype))
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    df = pd.read_csv(os.path.join(HERE, csvfile))
+    x, y = np.array(df[xcol]), np.array(df[ycol])
+    result = {"name": name, "csv": csvfile, "sha1": digest, "K": K,
+              "type": ftype, "x_ref": float(x.max()),
+              "y_ref": float(y.max())}
+    try:
+        cstrt, rms_error = fit(np.log(x/x.max()), np.log(y/y.max()),
+                               K, ftype)
+        result.update(rms=float(rms_error), posynomials=terms(cstrt))
+    except Exception as e:
+        # not cached: a failure may be transient (e.g. the solver)
+        result.update(rms=None, error="%s: %s" % (type(e).__name__, e))
+        return result
+    with open(path + ".tmp", "w") as f:
+        json.dump(result, f)
+    os.rename(path + ".tmp", path)
+    return result
+
+
+def fit_all(processes=None):
+    "Returns {name: best fit} for every correlation, by RMS error"
+    if not os.path.isdir(CACHEDIR):
+        os.makedirs(CACHEDIR)
+    tasks = [(name, csvfile, xcol, ycol, csv_digest(csvfile), K, ftype)
+             for name, (csvfile, xcol, ycol) in CORRELATIONS.items()
+             for K in KS for ftype in TYPES]
+    pool = Pool(processes)
+    try:
+        results = pool.map(fit_one, tasks)
+    finally:
+        pool.terminate()
+    best = OrderedDict()
+    for result in results:
+        print "%-6s K=%i %-5s rms %s" % (result["name"], result["K"],
+                                         result["type"], result["rms"])
+        if result["rms"] is None:
+            continue
+        name = result["name"]
+        if name not in best or result["rms"] < best[name]["rms"]:
+            best[name] = result
+    return best
+
+
+TEMPLATE = '''"""Fitted Re correlations for RectangularPipe (eta_h and Pf)
+
+Autogenerated by drela_derived/fitcorrelations.py; do not edit by hand.
+Each fit is a list of posynomials p(u, w) <= 1 (or == 1 if "equality")
+of (c, a, b) terms c*u**a*w**b, where u is Re/x_ref and w the fitted
+quantity over y_ref (both the maxima of the fitted data); constraints()
+and value() take Re and the quantity itself.
+"""
+import numpy as np
+
+FITS = %s
+
+
+def constraints(name, x, y):
+    """The fit's constraints between monomials x (Re) and y (the quantity)
+
+    Both are normalized here, by the fit's own x_ref and y_ref.
+    """
+    u, w = x/FITS[name]["x_ref"], y/FITS[name]["y_ref"]
+    cs = []
+    for posy in FITS[name]["posynomials"]:
+        monomials = [c*u**a*w**b for c, a, b in posy]
+        p = sum(monomials[1:], monomials[0])
+        cs.append(p == 1 if FITS[name]["equality"] else p <= 1)
+    return cs
+
+
+def value(name, x, iterations=60):
+    """Evaluates the fitted quantity y at (arrays of) x
+
+    Every posynomial is decreasing in w, so w is the largest of the
+    values making each one equal to 1: closed form when all of a
+    posynomial's terms share an exponent of w, else found by bisection
+    on log w.
+    """
+    u = np.asarray(x, dtype=float)/FITS[name]["x_ref"]
+    ws = []
+    for posy in FITS[name]["posynomials"]:
+        bs = set(b for _, _, b in posy)
+        if len(bs) == 1:
+            total = sum(c*u**a for c, a, _ in posy)
+            ws.append(total**(-1./bs.pop()))
+            continue
+        lo, hi = -50*np.ones(u.shape), 50*np.ones(u.shape)
+        for _ in range(iterations):
+            mid = (lo + hi)/2
+            p = sum(c*u**a*np.exp(b*mid) for c, a, b in posy)
+            lo, hi = np.where(p > 1, mid, lo), np.where(p > 1, hi, mid)
+        ws.append(np.exp((lo + hi)/2))
+    return FITS[name]["y_ref"]*np.max(ws, axis=0)
+'''
+
+
+def generate(best, filename=MODULE):
+    "Writes the correlations module for the chosen fits"
+    fits = {}
+    for name, result in best.items():
+        fits[str(name)] = {
+            "type": str(result["type"]), "K": int(result["K"]),
+            "rms": result["rms"], "csv": str(result["csv"]),
+            "sha1": str(result["sha1"]), "x_ref": float(result["x_ref"]),
+            "y_ref": float(result["y_ref"]),
+            # K=1 fits are a monomial, kept as an equality; the K
+            # monomials of an MA fit are each only a lower bound on w
+            "equality": int(result["K"]) == 1,
+            "posynomials": [[tuple(term) for term in posy]
+                            for posy in result["posynomials"]]}
+    # indent pformat's continuation lines to line up after "FITS = "
+    text = pformat(fits, width=72).replace("\n", "\n       ")
+    with open(filename, "w") as f:
+        f.write(TEMPLATE % text)
+
+
+if __name__ == "__main__":
+    generate(fit_all())
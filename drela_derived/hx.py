@@ -1,4 +1,6 @@
-from gpkit import Model, parse_variables
+from multiprocessing import Pool
+from time import time
+from gpkit import Model, parse_variables, Vectorize, units
 import numpy as np
 
 
@@ -51,16 +53,19 @@ class ChannelP(Model):
 
     Upper Unbounded
     ---------------
-    fV, A_e, P0_i, mu_o, mu_i
+    A_e, fV (if single), P0_i (if single), mu_o (if single), mu_i (if single)
 
     Lower Unbounded
     ---------------
-    fr, fV, V_o, P_o, V_i, rho_i, rho_o, mu_o, mu_i, Pf_ref
+    fr, fV, V_o, rho_i, rho_o, Pf_ref
+    P_o (if single), V_i (if single), mu_o (if single), mu_i (if single)
 
     """
     def setup(self, channel, state):
         exec parse_variables(ChannelP.__doc__)
         self.channel = channel
+        # the docstring's "(if single)" bounds only hold for a single state
+        self.single = not getattr(state.V_i, "shape", None)
 
         mu_i = self.mu_i = state.mu_i
         mu_o = self.mu_o = state.mu_o
@@ -168,8 +173,171 @@ class HX(Model):
         return self.channel, self.channelP, self.state
 
 
+class HXEnvelope(Model):
+    """One channel sized against an envelope of flow states
+
+    The states (and the channel's performance in each) are vectorized, so
+    the whole envelope is a single GP. If channel is an (h, l) pair in
+    meters, the channel is fixed to it within a factor of 1 + relax, so
+    that a design checked against its own states stays feasible despite
+    solver tolerances.
+
+    Variables
+    ---------
+    D_max           [N]           largest exit area x force per frontal area
+
+    Upper Unbounded
+    ---------------
+    A_r (if free), D_max
+
+    Lower Unbounded
+    ---------------
+    fr (if free), rho_i (if free), P_i (if free)
+    """
+    def setup(self, Nstates, channel=None, relax=1e-3):
+        exec parse_variables(HXEnvelope.__doc__)
+        self.Nstates = Nstates
+        self.free = channel is None
+        self.channel = Channel()
+        with Vectorize(Nstates):
+            self.state = HXState()
+            self.channelP = self.channel.dynamic(self.state)
+
+        self.mdot = self.channelP.mdot
+        self.fr = self.channelP.fr
+        self.A_e = self.channelP.A_e
+        self.A_r = self.channel.A_r
+        self.rho_i = self.state.rho_i
+        self.P_i = self.state.P_i
+
+        constraints = [D_max >= self.channelP.A_e*self.channelP.fr]
+        if channel:
+            h, l = [x*units("m") for x in channel]
+            constraints.extend([self.channel.h <= (1 + relax)*h,
+                                self.channel.h >= h/(1 + relax),
+                                self.channel.l <= (1 + relax)*l,
+                                self.channel.l >= l/(1 + relax)])
+        return self.channel, self.channelP, self.state, constraints
+
+
+def envelope(V_i, T_i, P_o):
+    "Substitutions for an envelope of flow states (arrays in m/s, K, Pa)"
+    V_i = np.asarray(V_i, dtype=float)
+    return {"V_i": V_i, "T_i": np.asarray(T_i, dtype=float),
+            "P_o": np.asarray(P_o, dtype=float),
+            # as in HXState's default incoming total pressure
+            "P0_i": 0.5*1.25*V_i**2 + 101000}
+
+
+def envelope_model(states, channel=None):
+    """An HXEnvelope with states substituted, minimizing its worst case
+
+    If channel is an (h, l) pair in meters, the channel is fixed to it.
+    """
+    m = HXEnvelope(len(states["V_i"]), channel)
+    m.cost = m.channel.A_r*m.channel.l*m.D_max
+    for name, value in states.items():
+        m.substitutions[getattr(m.state, name)] = value
+    return m
+
+
+def take(states, index):
+    return dict((name, value[index]) for name, value in states.items())
+
+
+def active_states(m, sol, tol=1e-4):
+    """Indices of the states that limit the design: those setting D_max
+    (within tol) or whose heat flow requirement has a sensitivity > tol"""
+    drag = (sol(m.channelP.A_e)*sol(m.channelP.fr)).to("N").magnitude
+    tight = drag >= (1 - tol)*sol(m.D_max).to("N").magnitude
+    sens = sol["sensitivities"]["constants"]
+    active = []
+    for i, el in enumerate(m.channelP.Hdot.flat):
+        if tight[i] or abs(sens.get(el.key, 0)) > tol:
+            active.append(i)
+    return active
+
+
+def solve_states(task):
+    """Solves an envelope in a worker: returns (h, l) and the global
+    indices of the active states, or None if it is infeasible"""
+    states, indices, channel = task
+    m = envelope_model(states, channel)
+    try:
+        sol = m.solve(verbosity=0)
+    except Exception:  # infeasible, or a solver failure
+        return None
+    design = (sol["variables"][m.channel.h], sol["variables"][m.channel.l])
+    return design, [indices[i] for i in active_states(m, sol)]
+
+
+def solve_envelope(states, chunksize=500, processes=None, maxrounds=5):
+    """Sizes one channel for every state, returning (h, l) in meters
+
+    Envelopes up to chunksize states are one GP. Larger ones are solved
+    by active sets: every chunk, together with the states already found
+    active, is solved in a process pool, and the states limiting each
+    chunk's design are collected. The channel is then sized against all
+    active states, checked against every chunk with the channel fixed,
+    and chunks it fails are added in another round.
+    """
+    N = len(states["V_i"])
+    if N <= chunksize:
+        result = solve_states((states, range(N), None))
+        if result is None:
+            raise ValueError("the envelope is infeasible")
+        return result[0]
+    chunks = [np.arange(i, min(i + chunksize, N))
+              for i in range(0, N, chunksize)]
+    active = np.array([], dtype=int)
+    pool = Pool(processes)
+    try:
+        for _ in range(maxrounds):
+            tasks = [(take(states, np.union1d(active, chunk)),
+                      list(np.union1d(active, chunk)), None)
+                     for chunk in chunks]
+            for result in pool.map(solve_states, tasks):
+                if result is None:
+                    raise ValueError("an envelope chunk is infeasible")
+                active = np.union1d(active, result[1]).astype(int)
+            result = solve_states((take(states, active), list(active),
+                                   None))
+            if result is None:
+                raise ValueError("the active states are infeasible")
+            design = result[0]
+            checks = pool.map(solve_states, [(take(states, chunk),
+                                              list(chunk), design)
+                                             for chunk in chunks])
+            chunks = [chunk for chunk, check in zip(chunks, checks)
+                      if check is None]
+            if not chunks:
+                return design
+    finally:
+        pool.terminate()
+    raise ValueError("no channel found for the whole envelope in %i rounds"
+                     % maxrounds)
+
+
+def random_envelope(N, seed=0):
+    "N random flight conditions around HXState's defaults"
+    rng = np.random.RandomState(seed)
+    return envelope(V_i=rng.uniform(20, 40, N),
+                    T_i=rng.uniform(-40, 0, N) + 273,
+                    P_o=rng.uniform(85000, 95000, N))
+
+
 if __name__ == "__main__":
     state = HXState()
     m = HX(state)
     m.cost = m.channel.A_r*m.channelP.A_e*m.channel.l*m.channelP.fr
     sol = m.solve()
+
+    print "%8s %10s %10s" % ("states", "one GP [s]", "chunked [s]")
+    for N in [10, 100, 1000, 3000]:
+        STATES = random_envelope(N)
+        START = time()
+        solve_envelope(STATES, chunksize=N)
+        SINGLE = time() - START
+        START = time()
+        solve_envelope(STATES, chunksize=max(10, N//8))
+        print "%8i %10.2f %10.2f" % (N, SINGLE, time() - START)
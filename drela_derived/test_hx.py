@@ -0,0 +1,30 @@
+"""Envelope sizing tests
+
+Run from drela_derived/: python -m pytest test_hx.py
+"""
+import unittest
+from hx import HX, HXState, HXEnvelope, random_envelope, solve_envelope, \
+    solve_states
+
+
+class TestEnvelope(unittest.TestCase):
+    def test_docstrings(self):
+        # verified on construction, scalar and vectorized
+        HX(HXState())
+        HXEnvelope(1)
+        HXEnvelope(3)
+        HXEnvelope(3, (2e-3, 5e-4))
+
+    def test_chunked(self):
+        states = random_envelope(24)
+        h, l = solve_envelope(states)
+        h_chunked, l_chunked = solve_envelope(states, chunksize=6,
+                                              processes=2)
+        self.assertAlmostEqual(h_chunked/h, 1, places=3)
+        self.assertAlmostEqual(l_chunked/l, 1, places=3)
+        # the design is feasible for its own states with the channel fixed
+        self.assertIsNotNone(solve_states((states, range(24), (h, l))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+"Columnar, append-only archive of Layer solutions with memory-mapped reads"
+import os
+import json
+import numpy as np
+from solcache import named_variables
+from multigrid import values
+
+
+def columns(m, sol):
+    """The archive columns of a solved Layer, as name -> (units, array)
+
+    Names are those of solcache.named_variables, prefixed "v:" for values
+    and "s:" for constant sensitivities, plus "cost".
+    """
+    cols = {"cost": ("-", np.array(sol["cost"], dtype=float))}
+    sens = sol["sensitivities"]["constants"]
+    for name, var in named_variables(m):
+        key = var.flat[0].key if hasattr(var, "flat") else var.key
+        for prefix, source, units in [
+                ("v:", sol, key.unitstr(options=":~", dimless="-")),
+                ("s:", {"variables": sens}, "-")]:
+            x = values(source, var)
+            if x is not None:
+                cols[prefix + name] = (units, np.asarray(x, dtype=float))
+    return cols
+
+
+class SolutionArchive(object):
+    """Append-only store of Layer solutions, one file per column
+
+    Column shapes depend on the grid size, so solutions are grouped by
+    it: directory/<Ncold>x<Nhot>/ holds one raw float64 file per column,
+    one row per solution, and index.json with the row count and every
+    column's shape and units. Reads memory-map only the requested
+    columns. A column a solution doesn't have is NaN in its row.
+    """
+    def __init__(self, directory="solutions"):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def group(self, gridsize):
+        return os.path.join(self.directory, "%ix%i" % tuple(gridsize))
+
+    def colpath(self, gridsize, name):
+        return os.path.join(self.group(gridsize),
+                            name.replace(":", "_") + ".f8")
+
+    def index(self, gridsize):
+        "The group's row count and column {name: {shape, units}}"
+        path = os.path.join(self.group(gridsize), "index.json")
+        if not os.path.exists(path):
+            return {"nrows": 0, "columns": {}}
+        with open(path) as f:
+            return json.load(f)
+
+    def gridsizes(self):
+        "The grid sizes with archived solutions"
+        return sorted(tuple(int(n) for n in d.split("x"))
+                      for d in os.listdir(self.directory)
+                      if os.path.exists(os.path.join(self.directory, d,
+                                                     "index.json")))
+
+    def append(self, gridsize, rows):
+        """Appends solutions, each a dict as returned by columns()
+
+        Column data is written before the index, so an interrupted append
+        leaves the archive as it was.
+        """
+        if not rows:
+            return
+        if not os.path.isdir(self.group(gridsize)):
+            os.makedirs(self.group(gridsize))
+        index = self.index(gridsize)
+        nrows, cols = index["nrows"], index["columns"]
+        known = set(cols)
+        for row in rows:
+            for name, (units, x) in row.items():
+                if name not in cols:
+                    cols[name] = {"shape": list(np.shape(x)), "units": units}
+        for name, col in cols.items():
+            size = int(np.prod(col["shape"]))
+            block = np.nan*np.ones((len(rows), size))
+            for i, row in enumerate(rows):
+                if name in row:
+                    block[i] = np.ravel(row[name][1])
+            path = self.colpath(gridsize, name)
+            if name not in known:
+                # a new column: earlier rows don't have it
+                block = np.vstack([np.nan*np.ones((nrows, size)), block])
+                mode = "wb"
+            elif os.path.getsize(path) < 8*size*nrows:
+                raise IOError("archive column %s is truncated" % name)
+            else:
+                mode = "r+b"
+            with open(path, mode) as f:
+                # drop whatever an interrupted append left past the index
+                f.truncate(8*size*nrows if mode == "r+b" else 0)
+                f.seek(0, 2)
+                np.asarray(block, dtype="<f8").tofile(f)
+        index["nrows"] = nrows + len(rows)
+        path = os.path.join(self.group(gridsize), "index.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.rename(path + ".tmp", path)
+
+    def column(self, gridsize, name):
+        "A read-only memory map of one column, shaped [nrows] + its shape"
+        index = self.index(gridsize)
+        if name not in index["columns"]:
+            raise KeyError("%s is not archived for grid %s" % (name,
+                                                               gridsize))
+        shape = tuple([index["nrows"]] + index["columns"][name]["shape"])
+        if not index["nrows"]:
+            return np.empty(shape)
+        return np.memmap(self.colpath(gridsize, name), dtype="<f8",
+                         mode="r", shape=shape)
+
+    def units(self, gridsize, name):
+        return self.index(gridsize)["columns"][name]["units"]
+
+    def query(self, names, gridsize=None):
+        """Returns {name: array} for the named columns
+
+        With a gridsize, the arrays are memory maps of that group;
+        otherwise every group is read and concatenated (so columns must
+        have the same shape in all of them, e.g. scalars like v:Q).
+        """
+        if gridsize is not None:
+            return dict((name, self.column(gridsize, name))
+                        for name in names)
+        groups = [g for g in self.gridsizes()
+                  if all(n in self.index(g)["columns"] for n in names)]
+        return dict((name, np.concatenate([self.column(g, name)
+                                           for g in groups]))
+                    for name in names)
+
+
+if __name__ == "__main__":
+    from time import time
+    from sweep import grid, sweep
+    ARCHIVE = SolutionArchive("solutions")
+    POINTS = grid(Ti_hotfluid=[350, 400, 450, 500],
+                  vi_coldfluid=[10, 20, 30])
+    for _ in sweep(POINTS, archive=ARCHIVE):
+        pass
+    START = time()
+    DATA = ARCHIVE.query(["v:Q", "v:T_in_hot"])
+    print "%i runs, Q vs. T_in_hot read in %.1f ms" % (
+        len(DATA["v:Q"]), 1e3*(time() - START))
@@ -0,0 +1,87 @@
+"In-memory store of recent solution artifacts, written to disk on request"
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from gpkit.keydict import KeyDict
+from gpkit.solution_array import SolutionArray
+
+
+class ArtifactStore(object):
+    """Keeps a session's most recent solutions and CSM files in memory
+
+    Each solution is held as one float array in the order of its model's
+    sorted varkeys; the sorted keys and their unit strings are computed
+    once per model. Only the newest maxitems artifacts are kept.
+    """
+    def __init__(self, maxitems=20):
+        self.maxitems = maxitems
+        self.items = OrderedDict()  # ID -> (model, values, csm text)
+        self.layouts = {}  # id(model) -> (model, keys, unit strings)
+
+    def ids(self):
+        return list(self.items)
+
+    def layout(self, m):
+        "The sorted varkeys of m and their unit strings"
+        if id(m) not in self.layouts:
+            keys = sorted(m.varkeys, key=str)
+            units = [k.unitstr(options=":~", dimless="-") for k in keys]
+            self.layouts[id(m)] = (m, keys, units)
+        return self.layouts[id(m)]
+
+    def add(self, ID, m, sol, csm):
+        "Stores a solution (and its CSM text), rotating out the oldest"
+        _, keys, _ = self.layout(m)
+        values = np.array([sol["variables"][k] for k in keys], dtype=float)
+        self.items[ID] = (m, values, csm)
+        while len(self.items) > self.maxitems:
+            self.items.popitem(last=False)
+        inuse = set(id(item[0]) for item in self.items.values())
+        for modelid in list(self.layouts):
+            if modelid not in inuse:
+                del self.layouts[modelid]
+
+    def soltext(self, ID):
+        "The sol_%03i.txt table for an artifact"
+        m, values, _ = self.items[ID]
+        _, keys, units = self.layout(m)
+        return soltext(keys, units, values)
+
+    def solution(self, ID):
+        "An artifact's model and a SolutionArray of its variables"
+        m, values, _ = self.items[ID]
+        _, keys, _ = self.layout(m)
+        sol = SolutionArray()
+        sol["variables"] = KeyDict(zip(keys, values))
+        return m, sol
+
+    def save(self, ID, outdir, background=True):
+        """Writes sol_%03i.txt and HX_%03i.csm for an artifact
+
+        By default the formatting and writing happen in a background
+        thread, which is returned.
+        """
+        m, values, csm = self.items[ID]
+        _, keys, units = self.layout(m)
+        args = (ID, outdir, keys, units, values, csm)
+        if not background:
+            return write(*args)
+        thread = threading.Thread(target=write, args=args)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+def soltext(keys, units, values):
+    "Formats a solution as the sol_%03i.txt table"
+    return "".join("%s [%s]\t\t%f\n" % row
+                   for row in zip(keys, units, values))
+
+
+def write(ID, outdir, keys, units, values, csm):
+    "Writes one artifact's files"
+    with open(os.path.join(outdir, "sol_%03i.txt" % ID), "w") as f:
+        f.write(soltext(keys, units, values))
+    with open(os.path.join(outdir, "HX_%03i.csm" % ID), "w") as f:
+        f.write(csm)
@@ -0,0 +1,325 @@
+"""Non-blocking, multi-client websocket server: solves run in workers
+
+The socket loop never waits on localsolve. Each connection is a session
+with its own warm starts and output directory; it has at most one solve
+in flight, and messages that arrive meanwhile are coalesced so only the
+newest is solved next, with replies to superseded requests dropped. The
+worker pool is shared across sessions, longest-waiting first, and each
+session stays on one worker. Clients may also send {"type": "ping"} or
+{"type": "status"} at any time, and {"type": "cancel"} to stop their
+running solve (only the solve is interrupted: the worker and its
+sessions' warm starts survive). Progress messages are streamed after
+every SP iteration. {"type": "save"} writes a recent solution's files,
+from the worker that holds the client's session. Replies name the
+session's HX.csm, for the viewer to open. A worker process that dies is
+restarted, and its in-flight request answered with an error.
+"""
+import os
+import json
+import signal
+from time import time
+from itertools import count
+from multiprocessing import Process, Pipe
+from SimpleWebSocketServer import SimpleWebSocketServer, WebSocket
+import server
+
+CLIENTS = {}  # client -> session state (see AsyncHXGPServer.handleConnected)
+WORKERS = []
+SESSIONIDS = count(1)
+
+
+def worker_main(conn, outdir):
+    """Worker process loop: solves requests, streaming back their replies
+
+    Sessions are kept per worker, each writing to outdir/session_<id>
+    (outdir is the worker's own). SIGINT cancels the running solve, if
+    any; the session keeps its last completed solution.
+    """
+    sessions = {}
+    solving = [False]
+
+    def interrupt(signum, frame):
+        if solving[0]:
+            raise KeyboardInterrupt
+
+    signal.signal(signal.SIGINT, interrupt)
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        seq, sid, data = job
+        if data.get("type") == "close":
+            sessions.pop(sid, None)
+            continue
+        if sid not in sessions:
+            sessions[sid] = server.Session(
+                os.path.join(outdir, "session_%03i" % sid))
+        if data.get("type") == "save":
+            conn.send((seq, server.save(data, sessions[sid])))
+            conn.send((seq, None))
+            continue
+        progress = lambda msg, seq=seq: conn.send((seq, msg))
+        solving[0] = True
+        try:
+            for reply in server.replies(data, sessions[sid], progress):
+                conn.send((seq, reply))
+        except KeyboardInterrupt:
+            print "cancelled request", seq
+        finally:
+            solving[0] = False
+        conn.send((seq, None))
+
+
+class Worker(object):
+    """A persistent solver process (keeping its sessions' warm starts)
+
+    If the process dies it is restarted, keeping its sessions pinned to it
+    (they lose their warm starts and in-memory solutions).
+    """
+    def __init__(self, outdir):
+        self.outdir = outdir
+        self.job = None  # (client, seq, start time)
+        self.sids = set()  # the sessions held by the process
+        self.start()
+
+    def start(self):
+        self.conn, child = Pipe()
+        self.process = Process(target=worker_main,
+                               args=(child, self.outdir))
+        self.process.daemon = True
+        self.process.start()
+        child.close()  # so that recv() sees EOF if the process dies
+
+    def restart(self):
+        "Replaces a dead process"
+        print "worker %s died (exit code %s); restarting" % (
+            self.outdir, self.process.exitcode)
+        self.conn.close()
+        self.process.join(0)
+        self.start()
+
+    def submit(self, client, sid, seq, data):
+        self.job = (client, seq, time())
+        self.sids.add(sid)
+        try:
+            self.conn.send((seq, sid, data))
+        except IOError:
+            pass  # the process died: results() reports it
+
+    def close(self, sid):
+        "Drops a session (after the current job, which is unaffected)"
+        self.sids.discard(sid)
+        try:
+            self.conn.send((None, sid, {"type": "close"}))
+        except IOError:
+            pass
+
+    def cancel(self):
+        """Interrupts the current solve; the worker stays busy until it
+        acknowledges, keeping its sessions"""
+        if self.job:
+            try:
+                os.kill(self.process.pid, signal.SIGINT)
+            except OSError:
+                pass
+
+    def results(self):
+        """Yields (client, seq, reply) for everything the worker has sent
+
+        If the process died, the client whose request was in flight gets
+        an error reply and the process is restarted.
+        """
+        while self.job:
+            try:
+                if not self.conn.poll():
+                    break
+                seq, reply = self.conn.recv()
+            except (EOFError, IOError):
+                client, seq, _ = self.job
+                self.job = None
+                self.restart()
+                yield client, seq, {"status": "unknown", "msg": "The solver"
+                                    " process failed; send it again."}
+                return
+            client = self.job[0]
+            if reply is None:
+                self.job = None
+            yield client, seq, reply
+        if not self.process.is_alive():
+            self.restart()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except IOError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+def status(client):
+    "Describes the client's in-flight and queued work"
+    state = CLIENTS.get(client, {})
+    for worker in WORKERS:
+        if worker.job and worker.job[0] is client:
+            return {"status": "solving",
+                    "msg": "Optimizing (%.0f s elapsed)..."
+                           % (time() - worker.job[2]),
+                    "queued": state.get("pending") is not None}
+    if state.get("pending") is not None:
+        return {"status": "queued", "msg": "Waiting for a solver..."}
+    return {"status": "idle", "msg": "No optimization in progress."}
+
+
+class AsyncHXGPServer(WebSocket):
+
+    def handleMessage(self):
+        print "< received", repr(self.data)
+        try:
+            data = json.loads(self.data)
+        except ValueError as e:
+            self.send({"status": "unknown", "msg": "The last message"
+                       " could not be parsed."})
+            print type(e), e
+            return
+        if data.get("type") == "ping":
+            self.send({"status": "pong", "msg": "pong", "time": time()})
+        elif data.get("type") == "status":
+            self.send(status(self))
+        elif data.get("type") == "cancel":
+            CLIENTS[self]["pending"] = None
+            CLIENTS[self]["latest"] += 1  # drop the solve's queued replies
+            for worker in WORKERS:
+                if worker.job and worker.job[0] is self:
+                    worker.cancel()
+            self.send({"status": "cancelled",
+                       "msg": "Optimization cancelled."})
+        elif data.get("type") == "save":
+            if CLIENTS[self]["worker"] is None:
+                self.send({"status": "unknown",
+                           "msg": "There is no solution to save yet."})
+            else:
+                CLIENTS[self]["saves"].append(data)
+        else:
+            state = CLIENTS[self]
+            state["latest"] += 1
+            state["pending"] = (state["latest"], data)
+            state["waiting"] = time()
+
+    def send(self, msg):
+        print "> sent", repr(msg)
+        self.sendMessage(unicode(json.dumps(msg)))
+
+    def handleConnected(self):
+        print self.address, "connected"
+        CLIENTS[self] = {"sid": next(SESSIONIDS), "latest": 0,
+                         "pending": None, "waiting": None, "worker": None,
+                         "heartbeat": 0., "saves": []}
+
+    def handleClose(self):
+        print self.address, "closed"
+        state = CLIENTS.pop(self, None)
+        if state and state["worker"]:
+            if state["worker"].job and state["worker"].job[0] is self:
+                state["worker"].cancel()
+            state["worker"].close(state["sid"])
+
+
+def dispatch(cancelstale=False):
+    """Hands idle workers the newest requests of the longest-waiting clients
+
+    A session lives on the worker that served its first request, which
+    holds its warm starts and output counters: later requests wait for
+    that worker. New sessions go to the idle worker with fewest sessions.
+    """
+    busy = set(w.job[0] for w in WORKERS if w.job)
+    for worker in WORKERS:
+        if worker.job and cancelstale:
+            client, seq, _ = worker.job
+            if (client in CLIENTS and seq is not None
+                    and CLIENTS[client]["latest"] != seq):
+                worker.cancel()
+    idle = [w for w in WORKERS if not w.job]
+    # save requests go to the worker holding the session's artifacts
+    for client, state in CLIENTS.items():
+        if state["saves"] and state["worker"] in idle:
+            idle.remove(state["worker"])
+            # no seq: a save is never superseded by newer requests
+            state["worker"].submit(client, state["sid"], None,
+                                   state["saves"].pop(0))
+    waiting = sorted(((state["waiting"], client)
+                      for client, state in CLIENTS.items()
+                      if state["pending"] is not None
+                      and client not in busy), key=lambda item: item[0])
+    for _, client in waiting:
+        if not idle:
+            break
+        state = CLIENTS[client]
+        worker = state["worker"] or min(idle, key=lambda w: len(w.sids))
+        if worker not in idle:
+            continue
+        idle.remove(worker)
+        seq, data = state["pending"]
+        state["pending"] = None
+        state["worker"] = worker
+        worker.submit(client, state["sid"], seq, data)
+
+
+def collect():
+    "Forwards worker replies, dropping those for superseded requests"
+    for worker in WORKERS:
+        for client, seq, reply in worker.results():
+            if reply is None or client not in CLIENTS:
+                continue
+            if seq is not None and seq != CLIENTS[client]["latest"]:
+                print "dropping superseded reply", seq
+                continue
+            client.send(reply)
+
+
+def heartbeat(interval):
+    "Sends a status message to clients whose solves are still running"
+    now = time()
+    for worker in WORKERS:
+        if not worker.job or worker.job[0] not in CLIENTS:
+            continue
+        state = CLIENTS[worker.job[0]]
+        if now - max(state["heartbeat"], worker.job[2]) > interval:
+            state["heartbeat"] = now
+            worker.job[0].send(status(worker.job[0]))
+
+
+def serve(port=8000, processes=2, cancelstale=False, initial=None,
+          statusinterval=5., outdir="sessions"):
+    """Runs the server until interrupted
+
+    processes is the number of solver worker processes shared by all
+    sessions, whose files go under outdir/worker_<n>; with cancelstale,
+    a solve superseded by a newer request from its client is interrupted
+    rather than left to finish.
+    initial is an optional design request solved on startup. Clients
+    with a solve running get a status message every statusinterval
+    seconds.
+    """
+    WORKERS[:] = [Worker(os.path.join(outdir, "worker_%i" % i))
+                  for i in range(processes)]
+    if initial:
+        WORKERS[0].submit(None, 0, 0, initial)
+    ws = SimpleWebSocketServer('', port, AsyncHXGPServer)
+    try:
+        while True:
+            ws.serveonce()
+            collect()
+            dispatch(cancelstale)
+            heartbeat(statusinterval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in WORKERS:
+            worker.stop()
+    print "Python server has exited."
+
+
+if __name__ == "__main__":
+    serve(initial={"Cold_Channels": 3, "Hot_Channels": 3})
@@ -0,0 +1,123 @@
+"Solves one Layer structure at many operating points"
+from time import time
+import numpy as np
+from layer import Layer
+from sweep import OUTPUTS
+
+
+class BatchSolver(object):
+    """Compiles a Layer's signomial program once and re-solves it for rows
+    of substitution values
+
+    Arguments
+    ---------
+    m : Layer
+        the model to solve; its cost must already be set
+    names : list of str
+        names in m.design_parameters, one per column of the value arrays
+
+    The program is compiled once, in m.sp(). For each row the posynomials
+    of its GP that contain a batch parameter are re-substituted in place
+    and the signomial approximations rebuilt at the row's starting point,
+    as SequentialGeometricProgram.gp() updates them between iterations;
+    the GP's solve data is then regenerated without recompiling. Rows are
+    warm started from the previous row's solution.
+    """
+    def __init__(self, m, names):
+        self.m = m
+        self.names = list(names)
+        # the program's substitutions are a plain dict of VarKeys
+        self.keys = [m.design_parameters[name].key for name in self.names]
+        self.program = m.sp()
+        # (first index in the GP's hmaps, constraint) for the constraints
+        # with a batch parameter (index 0 is the cost)
+        gp, subs = self.program._gp, self.program.substitutions
+        self.subbed = []
+        i = 1
+        for cs in gp[0].flat(constraintsets=False):
+            n = len(cs.as_posyslt1(subs))
+            if any(key in cs.varkeys for key in self.keys):
+                self.subbed.append((i, cs))
+            i += n
+
+    def update(self, x0):
+        "Substitutes the current values into the GP, approximated at x0"
+        program = self.program
+        gp, subs = program._gp, program.substitutions
+        if any(key in program.cost.varkeys for key in self.keys):
+            gp.posynomials[0] = program.cost.sub(subs)
+            gp.hmaps[0] = gp.posynomials[0].hmap
+        for i, cs in self.subbed:
+            for j, posy in enumerate(cs.as_posyslt1(subs)):
+                if len(posy.hmap) != gp.k[i + j]:
+                    raise ValueError("substituting %s changed the GP's"
+                                     " structure" % cs)
+                gp.posynomials[i + j] = posy
+                gp.hmaps[i + j] = posy.hmap
+        # as in SequentialGeometricProgram.init_gp and .gp
+        x0 = program._fill_x0(x0)
+        mono_gts = []
+        for spc in program._spconstrs:
+            x0.update((vk, 1.0) for vk in spc.varkeys if vk not in x0)
+            mono_gts.extend(spc.as_approxsgt(x0))
+        for i, mono_gt in enumerate(mono_gts):
+            unsubbed = program._approx_lt[i]/mono_gt
+            gp[1][i].unsubbed = [unsubbed]
+            smap = unsubbed.hmap.sub(subs, unsubbed.varkeys)
+            gp.hmaps[program._numgpconstrs + i] = smap
+            gp.posynomials[program._numgpconstrs + i].hmap = smap
+        gp.x0 = x0
+        gp.gen()
+
+    def solve(self, X, warmstart=True, **solveargs):
+        """Solves every row of X (shape [npoints, len(names)])
+
+        Returns (outputs, results): outputs is an [npoints, len(OUTPUTS)]
+        array (NaN where a solve failed), results the raw solve results.
+        """
+        X = np.atleast_2d(X)
+        solveargs.setdefault("verbosity", 0)
+        outputs = np.nan*np.ones((len(X), len(OUTPUTS)))
+        results = []
+        x0 = None
+        for i, row in enumerate(X):
+            for key, value in zip(self.keys, row):
+                self.program.substitutions[key] = value
+            try:
+                self.update(x0)
+                # without an x0 localsolve starts from the GP as updated
+                result = self.program.localsolve(**solveargs)
+            except Exception as e:
+                print "point %i: %s" % (i, repr(e))
+                results.append(None)
+                x0 = None
+                continue
+            results.append(result)
+            outputs[i] = [result["variables"][getattr(self.m, name)]
+                          for name in OUTPUTS]
+            if warmstart:
+                x0 = result["variables"]
+        return outputs, results
+
+
+if __name__ == "__main__":
+    M = Layer(4, 4)
+    M.cost = 1/M.Q
+    NAMES = ["Ti_hotfluid", "vi_coldfluid"]
+    X = np.array([(T, v) for T in np.linspace(400, 500, 5)
+                  for v in np.linspace(10, 30, 5)])
+
+    START = time()
+    OUT, _ = BatchSolver(M, NAMES).solve(X)
+    BATCH = time() - START
+
+    START = time()
+    for ROW in X:
+        MI = Layer(4, 4)
+        MI.cost = 1/MI.Q
+        for NAME, VALUE in zip(NAMES, ROW):
+            MI.substitutions[MI.design_parameters[NAME]] = VALUE
+        MI.localsolve(verbosity=0)
+    SINGLE = time() - START
+    print "%i points: batch %.2fs, individual localsolves %.2fs" % (
+        len(X), BATCH, SINGLE)
@@ -0,0 +1,200 @@
+"Timing benchmarks for Layer construction and post-processing"
+from time import time
+import numpy as np
+from layer import Layer
+from gencsm import tile_table
+from presolve import presolve
+from profiling import profiled_localsolve
+
+GRIDS = [4, 8, 12, 16, 20, 25, 30]
+
+
+def timeit(fn, *args, **kwargs):
+    "Returns (seconds, result) for a single call of fn"
+    start = time()
+    result = fn(*args, **kwargs)
+    return time() - start, result
+
+
+def scalar_cellwidths(m):
+    "The pre-vectorization cell-width constraints, built one cell at a time"
+    constraints = []
+    for j in range(m.Nhotpipes):
+        for i in range(m.Ncoldpipes):
+            constraints.extend([
+                m.cells.x_cell[i, j] == m.hotpipes.w[j],
+                m.cells.y_cell[i, j] == m.coldpipes.w[i],
+            ])
+    return constraints
+
+
+def array_cellwidths(m):
+    "The cell-width constraints as used in Layer.setup"
+    return [m.cells.x_cell == m.hotpipes.w,
+            m.cells.y_cell.T == m.coldpipes.w]
+
+
+def problem_size(m):
+    "Returns (number of variables, number of monomials) in a model"
+    nmonomials = 0
+    for constraint in m.flat(constraintsets=False):
+        for side in (constraint.left, constraint.right):
+            nmonomials += len(getattr(side, "exps", [None]))
+    return len(m.varkeys), nmonomials
+
+
+def bench_build(grids=GRIDS):
+    "Prints Layer build time and cell-width constraint time vs. grid size"
+    print "%8s %12s %12s %12s" % ("grid", "Layer [s]", "scalar [s]",
+                                  "array [s]")
+    for N in grids:
+        t_build, m = timeit(Layer, N, N)
+        t_scalar, _ = timeit(scalar_cellwidths, m)
+        t_array, _ = timeit(array_cellwidths, m)
+        print "%8s %12.3f %12.4f %12.4f" % ("%ix%i" % (N, N), t_build,
+                                            t_scalar, t_array)
+
+
+def bench_cumulative(grids=GRIDS):
+    """Prints problem size, SP compile time and Q for both pipe-length forms
+
+    The forms are equivalent but can converge to different local optima,
+    so their Q need not agree.
+    """
+    print "%8s %10s %8s %10s %12s %10s" % ("grid", "form", "vars",
+                                           "monomials", "compile [s]",
+                                           "Q [W]")
+    for N in grids:
+        for cumulative in (False, True):
+            Layer.cumulative_lengths = cumulative
+            try:
+                m = Layer(N, N)
+            finally:
+                Layer.cumulative_lengths = False
+            m.cost = 1/m.Q
+            nvars, nmonomials = problem_size(m)
+            t_compile, _ = timeit(m.sp)
+            sol = m.localsolve(verbosity=0)
+            print "%8s %10s %8i %10i %12.3f %10.4g" % (
+                "%ix%i" % (N, N), "running" if cumulative else "partial",
+                nvars, nmonomials, t_compile, sol["variables"][m.Q])
+
+
+def bench_presolve(grids=GRIDS[:4]):
+    "Prints first-GP size, solve time and Q without and with presolve"
+    print "%8s %9s %8s %10s %10s %10s" % ("grid", "presolve", "vars",
+                                          "monomials", "solve [s]", "Q [W]")
+    for N in grids:
+        for folded in (False, True):
+            m = Layer(N, N)
+            m.cost = 1/m.Q
+            if folded:
+                report = presolve(m, measure=True)
+            record, sol = profiled_localsolve(m, verbosity=0)
+            print "%8s %9s %8i %10i %10.2f %10.4g" % (
+                "%ix%i" % (N, N), "on" if folded else "off",
+                record["variables"], record["monomials"], record["solve"],
+                sol["variables"][m.Q])
+        print ("%8s presolve substituted %i variables; the GP lost %i"
+               " variables, %i constraints, %i monomials" % (
+                   "", report["substituted"], report["variables"],
+                   report["constraints"], report["monomials"]))
+
+
+def bench_aliases(grids=[10, 20, 30, 40]):
+    "Prints problem size and solve time with separate and merged aliases"
+    print "%8s %8s %8s %10s %10s %10s" % ("grid", "aliases", "vars",
+                                          "monomials", "solve [s]", "Q [W]")
+    for N in grids:
+        for merged in (False, True):
+            Layer.merge_aliases = merged
+            try:
+                m = Layer(N, N)
+            finally:
+                Layer.merge_aliases = False
+            m.cost = 1/m.Q
+            nvars, nmonomials = problem_size(m)
+            record, sol = profiled_localsolve(m, verbosity=0)
+            print "%8s %8s %8i %10i %10.2f %10.4g" % (
+                "%ix%i" % (N, N), "merged" if merged else "separate",
+                nvars, nmonomials, record["solve"], sol["variables"][m.Q])
+
+
+def check_aliases(N=2, rtol=1e-3):
+    "Asserts merged and separate aliases reach the same Q on a small grid"
+    Q = []
+    for merged in (False, True):
+        Layer.merge_aliases = merged
+        try:
+            m = Layer(N, N)
+        finally:
+            Layer.merge_aliases = False
+        m.cost = 1/m.Q
+        Q.append(m.localsolve(verbosity=0)["variables"][m.Q])
+    assert abs(Q[1] - Q[0]) < rtol*Q[0], Q
+    print "aliases: %ix%i Q %.3f W separate, %.3f W merged" % (N, N, Q[0],
+                                                               Q[1])
+
+
+def legacy_tile_table(x, y, hxVals, nv=2):
+    "The per-knot interp2d tile table gencsm used to write"
+    from scipy.interpolate import interp2d
+    nu, nw = len(x) - 1, len(y) - 1
+    xy = np.array([(x[i], y[j]) for j in range(nw+1) for i in range(nu+1)])
+    xycent = np.array([[(x[i+1] + x[i])/2, (y[j+1]+y[j])/2]
+                       for j in range(nw) for i in range(nu)])
+    intlist = [interp2d(xycent[:, 0], xycent[:, 1], vals, kind='linear')
+               for vals in hxVals]
+    text = []
+    for w in range(nw+1):
+        for v in range(nv+1):
+            for u in range(nu+1):
+                for k in range(len(intlist)):
+                    text.append("%.4f " % intlist[k](xy[u+w*u, 0],
+                                                     xy[u+w*u, 1])[0])
+                text.append("\n")
+            text.append("\n")
+    return "".join(text)
+
+
+def synthetic_cells(N):
+    "Knot coordinates and four linear cell fields for an NxN grid"
+    x = np.cumsum([0.] + list(np.linspace(1, 2, N)))
+    y = np.cumsum([0.] + list(np.linspace(2, 1, N)))
+    xc, yc = (x[1:] + x[:-1])/2, (y[1:] + y[:-1])/2
+    hxVals = [a*xc[:, np.newaxis] + b*yc[np.newaxis, :]
+              for a, b in [(1, 0), (0, 1), (1, 1), (2, -1)]]
+    return x, y, hxVals
+
+
+def check_tile_table(N=6):
+    "Asserts every interior knot samples the cells around its own corner"
+    x, y, hxVals = synthetic_cells(N)
+    rows = [map(float, line.split())
+            for line in tile_table(x, y, hxVals).split("\n") if line]
+    knots = np.array(rows).reshape(N + 1, 3, N + 1, 4)
+    for w in range(1, N):
+        for u in range(1, N):
+            for k, (a, b) in enumerate([(1, 0), (0, 1), (1, 1), (2, -1)]):
+                assert abs(knots[w, 0, u, k] - (a*x[u] + b*y[w])) < 1e-3
+    print "tile table: every interior knot matches its cell corner"
+
+
+def bench_gencsm(grids=GRIDS):
+    "Prints tile table generation time, per-knot interp2d vs. vectorized"
+    print "%8s %14s %14s" % ("grid", "interp2d [s]", "vectorized [s]")
+    for N in grids:
+        x, y, hxVals = synthetic_cells(N)
+        t_legacy, _ = timeit(legacy_tile_table, x, y, hxVals)
+        t_new, _ = timeit(tile_table, x, y, hxVals)
+        print "%8s %14.4f %14.4f" % ("%ix%i" % (N, N), t_legacy, t_new)
+
+
+if __name__ == "__main__":
+    bench_build()
+    bench_cumulative()
+    check_tile_table()
+    bench_gencsm()
+    bench_presolve()
+    check_aliases()
+    bench_aliases()
@@ -1,3 +1,5 @@
+import os
+from multiprocessing import Pool
 from matplotlib.pyplot import *
 import numpy as np
 from mpl_toolkits.mplot3d import Axes3D
@@ -10,40 +12,55 @@ def nsf(num, n=1):
     return float(numstr)
 
 
-def plot_cells(m, Z, cm=cm.RdBu_r, verbosity=0, zscale=None, zoff=None):
-    "Plots a given array for every heat-exchange cell"
-    f, a = subplots(figsize=(12, 12))
-    sol = m.solution
-    Nhotpipes = m.Nhotpipes
-    Ncoldpipes = m.Ncoldpipes
-    Zmin, Zmax = Z.min(), Z.max()
-    dpos = 0
-    for i in range(Nhotpipes):
-        wpos = 0
-        for j in range(Ncoldpipes):
-            wcell = sol(m.coldpipes.w)[j].magnitude
-            dcell = sol(m.hotpipes.w)[i].magnitude
-            if not zscale:
-                z = ((Z[j, i] - Zmin) / (Zmax - Zmin)).magnitude
-            else:
-                z = (Z[j, i].magnitude - zoff) / zscale
-            r = Rectangle((dpos, wpos), dcell, wcell, facecolor=cm(z))
-            if verbosity:
-                labelx, labely = dpos, wpos + wcell / 2
-                label = "%.3g" % Z[j, i].magnitude
+def edges(widths):
+    "Cell edge coordinates from a row of cell widths"
+    return np.concatenate([[0.], np.cumsum(widths)])
+
+
+def magnitude(x):
+    return np.asarray(getattr(x, "magnitude", x), dtype=float)
+
+
+def draw_cells(a, x, y, Z, cmap, verbosity=0, zscale=None, zoff=None,
+               maxlabels=400):
+    """Draws [Ncold, Nhot] cell values on axes a as one pcolormesh
+
+    x and y are the cell edges along the hot and cold pipes. Colors span
+    Z's range, or [zoff, zoff + zscale] if zscale is given. Cell labels
+    (verbosity 1, or 2 to include indices) are skipped on grids of more
+    than maxlabels cells.
+    """
+    if zscale:
+        vmin, vmax = zoff, zoff + zscale
+    else:
+        vmin, vmax = Z.min(), Z.max()
+    a.pcolormesh(x, y, Z, cmap=cmap, vmin=vmin, vmax=vmax,
+                 edgecolors="face")
+    if verbosity and Z.size <= maxlabels:
+        Ncold, Nhot = Z.shape
+        for i in range(Nhot):
+            for j in range(Ncold):
+                labelx = x[i]
+                label = "%.3g" % Z[j, i]
                 if verbosity > 1:
                     label = "[%i,%i] : " % (i, j) + label
                 else:
-                    labelx += 0.4 * dcell
-                a.text(labelx, labely, label)
-            wpos += wcell
-            a.add_patch(r)
-        dpos += dcell
-    ylim([0, wpos])
-    xlim([0, dpos])
+                    labelx += 0.4*(x[i+1] - x[i])
+                a.text(labelx, (y[j] + y[j+1])/2, label)
+    a.set_xlim([0, x[-1]])
+    a.set_ylim([0, y[-1]])
     a.set_frame_on(False)
     a.set_xlabel("width traveled by cold fluid [cm]")
     a.set_ylabel("depth traveled by hot fluid [cm]")
+
+
+def plot_cells(m, Z, cm=cm.RdBu_r, verbosity=0, zscale=None, zoff=None):
+    "Plots a given array for every heat-exchange cell"
+    f, a = subplots(figsize=(12, 12))
+    sol = m.solution
+    x = edges(magnitude(sol(m.hotpipes.w)))
+    y = edges(magnitude(sol(m.coldpipes.w)))
+    draw_cells(a, x, y, magnitude(Z), cm, verbosity, zscale, zoff)
     return f, a
 
 
@@ -75,82 +92,89 @@ def hist_cells(m, Z, cm=cm.RdBu_r, verbosity=0, zscale=None, zoff=None):
     a.set_ylabel("depth traveled by hot fluid [cm]")
     return f, arun
 
+# (file name, title, colormap, [Ncold, Nhot] value of a solved Layer)
+FIGURES = [
+    ("T_hot", "Hot fluid temperature [K]", cm.Reds,
+     lambda m, sol: sol(m.cells.T_hot)),
+    ("T_cld", "Cold fluid temperature [K]", cm.Blues,
+     lambda m, sol: sol(m.cells.T_cld)),
+    ("dQ", "Heat transfer (%(Q).2f Watts total)", cm.Reds,
+     lambda m, sol: sol(m.cells.dQ)),
+    ("v_hot", "Average velocity in hot cell (m/s)", cm.Blues,
+     lambda m, sol: sol(m.hotpipes.v_avg)),
+    ("v_cld", "Average velocity in cold cell (m/s)", cm.Reds,
+     lambda m, sol: sol(m.coldpipes.v_avg).T),
+    ("Tr", "Mean wall temperature (K)", cm.Reds,
+     lambda m, sol: sol(m.cells.T_r)),
+    ("z_hot", "Hot cell height (cm)", cm.Reds,
+     lambda m, sol: sol(m.cells.z_hot)),
+    ("z_cld", "Cold cell height (cm)", cm.Blues,
+     lambda m, sol: sol(m.cells.z_cld)),
+    ("z", "Total cell height (cm)", cm.Blues,
+     lambda m, sol: (sol(m.cells.z_cld) + sol(m.cells.z_hot)
+                     + sol(m.cells.t_plate))),
+    ("f_hot", "Hot fin thickness (cm)", cm.Reds,
+     lambda m, sol: sol(m.cells.t_hot)),
+    ("f_cld", "Cold fin thickness (cm)", cm.Blues,
+     lambda m, sol: sol(m.cells.t_cld)),
+    # velocity*area at each segment's inlet, to confirm mass flow rates
+    ("vA_hot", "Velocity*area of hot flow (cm)", cm.Reds,
+     lambda m, sol: (sol(m.hotpipes.v)*sol(m.hotpipes.A))[:-1]),
+    ("vA_cld", "Velocity*area of cold flow (m^3/s)", cm.Reds,
+     lambda m, sol: (sol(m.coldpipes.v)*sol(m.coldpipes.A))[:-1].T),
+]
+
+
+def plot_data(m, sol):
+    """Everything gen_plots draws, pulled out of a solution once
+
+    Returns plain arrays (so they can be sent to other processes): the
+    cell edges x and y, Q, and one [Ncold, Nhot] array per figure.
+    """
+    data = {"x": edges(magnitude(sol(m.hotpipes.w))),
+            "y": edges(magnitude(sol(m.coldpipes.w))),
+            "Q": float(magnitude(sol(m.Q)))}
+    for name, _, _, value in FIGURES:
+        data[name] = magnitude(value(m, sol))
+    return data
+
+
+def render(data, outdir="plots"):
+    "Draws and saves every figure in FIGURES, reusing one canvas"
+    f = figure(figsize=(12, 12))
+    for name, title, cmap, _ in FIGURES:
+        f.clf()
+        a = f.add_subplot(111)
+        draw_cells(a, data["x"], data["y"], data[name], cmap, verbosity=2)
+        a.set_title(title % data)
+        f.savefig(os.path.join(outdir, name + ".png"))
+    close(f)
+
+
 def gen_plots(m, sol, Ncld, Nhot):
-    f, a = plot_cells(m, sol(m.c.T_hot), cm=cm.Reds,
-                      zscale=1 / Nhot / Ncld, zoff=0.625 / Nhot / Ncld, verbosity=2)
-    a.set_title("Hot fluid temperature [K]")
-    f.savefig("plots/T_hot.png")
-
-    # Air temperature
-    f, a = plot_cells(m, sol(m.c.T_cld), cm=cm.Blues,
-                      zscale=1 / Nhot / Ncld, zoff=0.625 / Nhot / Ncld, verbosity=2)
-    a.set_title("Cold fluid temperature [K]")
-    f.savefig("plots/T_cld.png")
-
-    # Heat transfer
-    Q = sol(m.Q).magnitude
-    f, a = plot_cells(m, sol(m.c.dQ), cm=cm.Reds,
-                      zscale=1 / Nhot / Ncld, zoff=0.625 / Nhot / Ncld, verbosity=2)
-    a.set_title("Heat transfer (%.2f Watts total)" % Q)
-    f.savefig("plots/dQ.png")
-
-    # Water velocity in each cell
-    f, a = plot_cells(m, sol(m.hotpipes.v_avg), cm=cm.Blues,
-                      zscale=1 / Nhot / Ncld, zoff=0.625 / Nhot / Ncld, verbosity=2)
-    a.set_title("Average velocity in hot cell (m/s)")
-    f.savefig("plots/v_hot.png")
-
-    # Air velocity in each cell
-    f, a = plot_cells(m, sol(m.coldpipes.v_avg).T, cm=cm.Reds,
-                      zscale=1 / Nhot / Ncld, zoff=0.625 / Nhot / Ncld, verbosity=2)
-    a.set_title("Average velocity in cold cell (m/s)")
-    f.savefig("plots/v_cld.png")
-
-    # Wall temperature
-    f, a = plot_cells(m, sol(m.c.T_r), cm=cm.Reds,
-                      zscale=1 / Nhot / Ncld, zoff=0.625 / Nhot / Ncld, verbosity=2)
-    a.set_title("Mean wall temperature (K)")
-    f.savefig("plots/Tr.png")
-
-    # Hot cell height
-    f, a = plot_cells(m, sol(m.c.z_hot), cm=cm.Reds,
-                      zscale=1 / Nhot / Ncld, zoff=0.625 / Nhot / Ncld, verbosity=2)
-    a.set_title("Hot cell height (cm)")
-    f.savefig("plots/z_hot.png")
-
-    # Cold cell height
-    f, a = plot_cells(m, sol(m.c.z_cld), cm=cm.Blues,
-                      zscale=1 / Nhot / Ncld, zoff=0.625 / Nhot / Ncld, verbosity=2)
-    a.set_title("Cold cell height (cm)")
-    f.savefig("plots/z_cld.png")
-
-    # Total cell height
-    f, a = plot_cells(m, sol(m.c.z_cld)+sol(m.c.z_hot)+sol(m.c.t_plate), cm=cm.Blues,
-                      zscale=1 / Nhot / Ncld, zoff=0.625 / Nhot / Ncld, verbosity=2)
-    a.set_title("Total cell height (cm)")
-    f.savefig("plots/z.png")
-
-    # Hot fin thickness
-    f, a = plot_cells(m, sol(m.c.t_hot), cm=cm.Reds,
-                      zscale=1 / Nhot / Ncld, zoff=0.625 / Nhot / Ncld, verbosity=2)
-    a.set_title("Hot fin thickness (cm)")
-    f.savefig("plots/f_hot.png")
-
-    # Cold fin thickness
-    f, a = plot_cells(m, sol(m.c.t_cld), cm=cm.Blues,
-                      zscale=1 / Nhot / Ncld, zoff=0.625 / Nhot / Ncld, verbosity=2)
-    a.set_title("Cold fin thickness (cm)")
-    f.savefig("plots/f_cld.png")
-
-    # Velocity area (to confirm mass flow rates) on hot side
-    f, a = plot_cells(m, sol(m.hotpipes.v)*sol(m.hotpipes.A), cm=cm.Reds,
-                      zscale=1 / Nhot / Ncld, zoff=0.625 / Nhot / Ncld, verbosity=2)
-    a.set_title("Velocity*area of hot flow (cm)")
-    f.savefig("plots/vA_hot.png")
-
-    # Velocity area (to confirm mass flow rates) on cold side
-    f, a = plot_cells(m,(sol(m.coldpipes.v)*sol(m.coldpipes.A)).T, cm=cm.Reds,
-                      zscale=1 / Nhot / Ncld, zoff=0.625 / Nhot / Ncld, verbosity=2)
-    a.set_title("Velocity*area of cold flow (m^3/s)")
-    f.savefig("plots/vA_cld.png")
+    render(plot_data(m, sol), "plots")
+
+
+def _headless():
+    switch_backend("Agg")
+
+
+def _render(args):
+    data, outdir = args
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    render(data, outdir)
+    return outdir
+
+
+def batch_plots(datas, outdirs, processes=None):
+    """Renders the figures of many solutions in a headless process pool
 
+    datas are plot_data() results (e.g. one per sweep point), each drawn
+    into the matching outdir. Returns the outdirs as they finish.
+    """
+    pool = Pool(processes, _headless)
+    try:
+        return list(pool.imap_unordered(_render, zip(datas, outdirs)))
+    finally:
+        pool.terminate()
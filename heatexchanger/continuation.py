@@ -0,0 +1,155 @@
+"Warm-started continuation sweeps along a design-parameter path"
+from time import time
+from multiprocessing import Pool
+import numpy as np
+import sweep
+from sweep import OUTPUTS, init_worker
+
+
+def order(points):
+    "Sorts sweep points along the design parameters that vary between them"
+    names = sorted(set(name for p in points for name in p))
+    varying = [name for name in names
+               if len(set(repr(p.get(name)) for p in points)) > 1]
+    return sorted(enumerate(points),
+                  key=lambda item: tuple(item[1].get(name)
+                                         for name in varying))
+
+
+def midpoint(start, target):
+    "Halfway between two design-parameter dicts (non-numeric values: target)"
+    mid = dict(target)
+    for name, value in target.items():
+        try:
+            mid[name] = 0.5*(np.asarray(start[name]) + np.asarray(value))
+        except (KeyError, TypeError):
+            pass
+    for name in ("Cold_Channels", "Hot_Channels"):
+        if name in target:
+            mid[name] = target[name]
+    return mid
+
+
+def solve(params, x0, gridsize, solveargs):
+    "Solves one point with this worker's cached Layer"
+    Ncoldpipes = params.get("Cold_Channels", gridsize[0])
+    Nhotpipes = params.get("Hot_Channels", gridsize[1])
+    m = sweep.CACHE[0].get(Ncoldpipes, Nhotpipes, params)
+    sol = m.localsolve(x0=x0, **solveargs)
+    return m, sol
+
+
+def advance(start, target, x0, gridsize, halvings, solveargs):
+    """Solves target warm-started from x0, halving the step on failure
+
+    Returns (model, solution, SP iterations over all converged solves).
+    """
+    try:
+        m, sol = solve(target, x0, gridsize, solveargs)
+        return m, sol, len(sol.program.gps)
+    except Exception:
+        if start is None or not halvings:
+            raise
+    mid = midpoint(start, target)
+    _, midsol, its_mid = advance(start, mid, x0, gridsize, halvings - 1,
+                                 solveargs)
+    m, sol, its = advance(mid, target, midsol["variables"], gridsize,
+                          halvings - 1, solveargs)
+    return m, sol, its_mid + its
+
+
+def solve_chain(task):
+    """Solves an ordered chain of points, each warm-started from the last
+
+    Returns a list of result rows; with coldstart, every point is also
+    solved without x0 so cold_iterations can be compared.
+    """
+    chain, gridsize, maxhalvings, coldstart, solveargs = task
+    if sweep.CACHE[0] is None:
+        init_worker(500e6)
+    rows = []
+    last = x0 = None
+    for index, params in chain:
+        row = dict(params)
+        row.update(index=index, status="optimal", iterations=None,
+                   cold_iterations=None)
+        size = (params.get("Cold_Channels", gridsize[0]),
+                params.get("Hot_Channels", gridsize[1]))
+        if last is not None and size != last[1]:
+            last = x0 = None
+        start = time()
+        try:
+            m, sol, row["iterations"] = advance(
+                last and last[0], params, x0, gridsize, maxhalvings,
+                solveargs)
+            for name in OUTPUTS:
+                row[name] = sol["variables"][getattr(m, name)]
+            last, x0 = (params, size), sol["variables"]
+        except Exception as e:
+            row["status"] = "%s: %s" % (type(e).__name__, e)
+            last = x0 = None
+        row["solve_time"] = time() - start
+        if coldstart:
+            try:
+                _, sol = solve(params, None, gridsize, solveargs)
+                row["cold_iterations"] = len(sol.program.gps)
+            except Exception:
+                pass
+        rows.append(row)
+    return rows
+
+
+def continuation(points, Ncoldpipes=3, Nhotpipes=3, chains=1,
+                 maxhalvings=3, coldstart=False, maxbytes=500e6,
+                 **solveargs):
+    """Solves points in path order, passing each solution on as x0
+
+    Arguments
+    ---------
+    points : list of dicts
+        design-parameter substitutions (see sweep.sweep)
+    chains : int
+        the ordered path is split into this many contiguous chains,
+        solved in parallel worker processes
+    maxhalvings : int
+        how many times a failed step may be halved by inserting
+        intermediate points
+    coldstart : bool
+        also solve every point cold, to report SP iterations saved
+
+    Yields result rows as each chain finishes.
+    """
+    solveargs.setdefault("verbosity", 0)
+    ordered = order(points)
+    nchains = max(1, min(chains, len(ordered)))
+    tasks = [([ordered[i] for i in idxs], (Ncoldpipes, Nhotpipes),
+              maxhalvings, coldstart, solveargs)
+             for idxs in np.array_split(np.arange(len(ordered)), nchains)]
+    if nchains == 1:
+        init_worker(maxbytes)
+        for row in solve_chain(tasks[0]):
+            yield row
+        return
+    pool = Pool(nchains, init_worker, (maxbytes,))
+    try:
+        for rows in pool.imap_unordered(solve_chain, tasks):
+            for row in rows:
+                yield row
+        pool.close()
+    finally:
+        pool.terminate()
+
+
+def iterations_saved(rows):
+    "Returns (warm iterations, cold iterations) over rows with both counts"
+    pairs = [(r["iterations"], r["cold_iterations"]) for r in rows
+             if r["iterations"] and r["cold_iterations"]]
+    return sum(w for w, _ in pairs), sum(c for _, c in pairs)
+
+
+if __name__ == "__main__":
+    PATH = [{"Ti_hotfluid": T} for T in np.linspace(350, 500, 16)]
+    ROWS = list(continuation(PATH, chains=2, coldstart=True))
+    WARM, COLD = iterations_saved(ROWS)
+    print "SP iterations: %i warm-started vs. %i cold (%i saved)" % (
+        WARM, COLD, COLD - WARM)
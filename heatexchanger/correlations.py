@@ -0,0 +1,70 @@
+"""Fitted Re correlations for RectangularPipe (eta_h and Pf)
+
+Seeded by hand from the fit coefficients formerly written out in
+RectangularPipe (their rms is unknown); drela_derived/fitcorrelations.py
+regenerates it from the CSVs. Each fit is a list of posynomials
+p(u, w) <= 1 (or == 1 if "equality") of (c, a, b) terms c*u**a*w**b,
+where u is Re/x_ref and w the fitted quantity over y_ref (both the
+maxima of the fitted data); constraints() and value() take Re and the
+quantity itself.
+"""
+import numpy as np
+
+FITS = {'Pf': {'K': 2,
+               'csv': 'PfFit.csv',
+               'equality': False,
+               'posynomials': [[(0.475, 0.00121, -0.155),
+                                (0.0338, -0.336, -0.155)]],
+               'rms': None,
+               'sha1': '3f7121f0e0c723caa0d3ed9d981db6a065b54481',
+               'type': 'SMA',
+               'x_ref': 90552.31627,
+               'y_ref': 21.65551517},
+        'eta_h': {'K': 1,
+                  'csv': 'etahFit.csv',
+                  'equality': True,
+                  'posynomials': [[(0.799, -0.0296, -1.0)]],
+                  'rms': None,
+                  'sha1': '61b0090715e643a8bd332d9a74268ffe133162ae',
+                  'type': 'SMA',
+                  'x_ref': 92150.61458,
+                  'y_ref': 0.917498225}}
+
+
+def constraints(name, x, y):
+    """The fit's constraints between monomials x (Re) and y (the quantity)
+
+    Both are normalized here, by the fit's own x_ref and y_ref.
+    """
+    u, w = x/FITS[name]["x_ref"], y/FITS[name]["y_ref"]
+    cs = []
+    for posy in FITS[name]["posynomials"]:
+        monomials = [c*u**a*w**b for c, a, b in posy]
+        p = sum(monomials[1:], monomials[0])
+        cs.append(p == 1 if FITS[name]["equality"] else p <= 1)
+    return cs
+
+
+def value(name, x, iterations=60):
+    """Evaluates the fitted quantity y at (arrays of) x
+
+    Every posynomial is decreasing in w, so w is the largest of the
+    values making each one equal to 1: closed form when all of a
+    posynomial's terms share an exponent of w, else found by bisection
+    on log w.
+    """
+    u = np.asarray(x, dtype=float)/FITS[name]["x_ref"]
+    ws = []
+    for posy in FITS[name]["posynomials"]:
+        bs = set(b for _, _, b in posy)
+        if len(bs) == 1:
+            total = sum(c*u**a for c, a, _ in posy)
+            ws.append(total**(-1./bs.pop()))
+            continue
+        lo, hi = -50*np.ones(u.shape), 50*np.ones(u.shape)
+        for _ in range(iterations):
+            mid = (lo + hi)/2
+            p = sum(c*u**a*np.exp(b*mid) for c, a, b in posy)
+            lo, hi = np.where(p > 1, mid, lo), np.where(p > 1, hi, mid)
+        ws.append(np.exp((lo + hi)/2))
+    return FITS[name]["y_ref"]*np.max(ws, axis=0)
@@ -10,6 +10,7 @@ import numpy as np
 
 from gpkit import Model, units
 from relaxed_constants import relaxed_constants
+from solcache import SolutionCache
 from gpkit.constraints.bounded import Bounded
 
 #from cellplot import gen_plots
@@ -53,7 +54,8 @@ m.cost = 1/m.Q
 #m = relaxed_constants(m)
 
 # Solving HX problem
-sol = m.localsolve(verbosity=2)
+solutions = SolutionCache()
+sol = solutions.localsolve(m, verbosity=2)
 #post_process(sol)
 print sol('Q')
 
@@ -1,8 +1,52 @@
+import re
 import numpy as np
-from scipy.interpolate import interp2d
-
-
-def gencsm(m, sol, ID):
+from cStringIO import StringIO
+
+# despmtrs the duct geometry is built from
+LAYOUT_PARAMETERS = ["x_width", "y_width", "z_width", "uknots", "vknots",
+                     "wknots"]
+
+
+def interp_matrix(xc, x):
+    """Matrix W such that W.dot(z) linearly interpolates z(xc) at x
+
+    Points outside [xc[0], xc[-1]] take the nearest end value.
+    """
+    n = len(xc)
+    W = np.zeros((len(x), n))
+    if n == 1:
+        W[:] = 1.
+        return W
+    i = np.clip(np.searchsorted(xc, x) - 1, 0, n - 2)
+    t = np.clip((x - xc[i])/(xc[i+1] - xc[i]), 0., 1.)
+    rows = np.arange(len(x))
+    W[rows, i] = 1 - t
+    W[rows, i+1] += t
+    return W
+
+
+def tile_table(x, y, hxVals, nv=2):
+    """Text of the tile table: hxVals sampled at every (u, v, w) knot
+
+    x and y are the nu+1 and nw+1 knot coordinates, hxVals a list of
+    [nu, nw] arrays of cell values, bilinearly interpolated from the cell
+    centres onto the knots in one call for all fields.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    Wu = interp_matrix((x[1:] + x[:-1])/2, x)
+    Ww = interp_matrix((y[1:] + y[:-1])/2, y)
+    # knots[w, u, k]: field k at knot (u, w)
+    knots = np.einsum("ui,kij,wj->wuk", Wu, np.array(hxVals), Ww)
+    line = " ".join(["%.4f"]*len(hxVals)) + " \n"
+    blocks = []
+    for block in knots:
+        block = "".join(line % tuple(row) for row in block) + "\n"
+        blocks.append(block*(nv + 1))
+    return "".join(blocks)
+
+
+def gencsm(m, sol, ID, filename='HX.csm'):
+    "Writes the CSM file for a solution (if filename) and returns its text"
     nu = m.Ncoldpipes
     nhot = nu
     nv = 2
@@ -11,20 +55,15 @@ def gencsm(m, sol, ID):
     nParams = 8
 
     # Creating corner coordinates
-    x = [sum(sol(m.coldpipes.w)[0:i].to("m").magnitude) for i in range(nu+1)]
-    y = [sum(sol(m.hotpipes.w)[0:i].to("m").magnitude) for i in range(nw+1)]
-    xy = np.array([(x[i], y[j]) for j in range(nw+1) for i in range(nu+1)])
-    xycent = np.array([[(x[i+1] + x[i])/2, (y[j+1]+y[j])/2]
-                       for j in range(nw) for i in range(nu)])
+    x = np.cumsum([0.] + list(sol(m.coldpipes.w).to("m").magnitude))
+    y = np.cumsum([0.] + list(sol(m.hotpipes.w).to("m").magnitude))
 
     hxVals = [10*sol(m.cells.t_plate).to("m").magnitude,
               10*sol(m.cells.t_hot).to("m").magnitude,
               10*sol(m.cells.t_cld).to("m").magnitude,
               (sol(m.cells.z_hot)/sol(m.cells.z_cld)).magnitude]
-    intlist = [interp2d(xycent[:, 0], xycent[:, 1], hxVals[i], kind='linear')
-               for i in range(len(hxVals))]
 
-    f = open('HX.csm', 'w')
+    f = StringIO()
     f.write("""# HeateXchanger
 # autogenerated CSM file
 
@@ -100,15 +139,7 @@ udparg tile tablename <<
     f.write('u' + '\n')
     f.write('hot2cold' + '\n')
     f.write('.' + '\n\n')
-
-    for w in range(nw+1):
-        for v in range(nv+1):
-            for u in range(nu+1):
-                for k in range(len(intlist)):
-                    f.write("%.4f" % intlist[k](xy[u+w*u, 0], xy[u+w*u, 1])[0])
-                    f.write(' ')
-                f.write('\n')
-            f.write('\n')
+    f.write(tile_table(x, y, hxVals, nv))
 
     f.write(""">>
 udparg tile nutile    1
@@ -123,4 +154,41 @@ restore duct
 attribute _name $duct
 """ % ID)
 
-    f.close()
+    text = f.getvalue()
+    if filename:
+        with open(filename, 'w') as out:
+            out.write(text)
+    return text
+
+
+def csm_parts(text):
+    """Splits gencsm output into (despmtr values, layout text)
+
+    The layout is everything the geometry is built from: the duct widths,
+    knots and tile table, with the output file's ID masked out.
+    """
+    pmtrs, layout = {}, []
+    for line in text.split("\n"):
+        words = line.split()
+        if (len(words) == 3 and words[0] == "despmtr"
+                and words[1] not in LAYOUT_PARAMETERS):
+            pmtrs[words[1]] = words[2]
+        else:
+            layout.append(line)
+    layout = re.sub(r"HX_\d+\.egads", "HX_ID.egads", "\n".join(layout))
+    return pmtrs, layout
+
+
+def csmdiff(old, new):
+    """Compares two gencsm outputs (old may be None)
+
+    Returns (pmtrs, layout): the despmtr values that changed, as a dict
+    of name to new value, and whether the geometry has to be rebuilt.
+    """
+    newpmtrs, newlayout = csm_parts(new)
+    if old is None:
+        return newpmtrs, True
+    oldpmtrs, oldlayout = csm_parts(old)
+    pmtrs = dict((name, value) for name, value in newpmtrs.items()
+                 if oldpmtrs.get(name) != value)
+    return pmtrs, newlayout != oldlayout
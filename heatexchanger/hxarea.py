@@ -1,5 +1,16 @@
 from gpkit import Model, parse_variables, SignomialsEnabled
 
+# cell variables a Layer can share with its pipes (see Layer.merge_aliases)
+SHARED = ["dQ", "h_hot", "h_cld", "T_hot", "T_cld", "Tr_hot", "Tr_cld",
+          "x_cell", "y_cell", "z_hot", "z_cld"]
+
+
+def without(doc, names):
+    "A Variables docstring without the lines declaring names"
+    return "\n".join(line for line in doc.split("\n")
+                     if line.split()[:1] not in [[name] for name in names])
+
+
 # Assumes hot water going S->N, and cold air going W->E, [0,0] at RH corner
 class HXArea(Model):
     """
@@ -33,9 +44,16 @@ class HXArea(Model):
      dQ, T_cld
 
     """
-    def setup(self, n_fins, material):
+    def setup(self, n_fins, material, aliases=None):
         self.n_fins = n_fins
-        exec parse_variables(HXArea.__doc__)
+        # aliases (name -> existing variable array) are used in place of
+        # declaring those variables
+        aliases = aliases or {}
+        exec parse_variables(without(HXArea.__doc__, aliases))
+        for name, var in aliases.items():
+            setattr(self, name, var)
+        (dQ, h_hot, h_cld, T_hot, T_cld, Tr_hot, Tr_cld, x_cell, y_cell,
+         z_hot, z_cld) = [getattr(self, name) for name in SHARED]
         with SignomialsEnabled():  # note that these turn into posynomials
             dQ_definition = [dQ <= (T_hot-Tr_hot)*h_hot*A_hot,
                              dQ <= (Tr_cld-T_cld)*h_cld*A_cld]
@@ -39,6 +39,10 @@ class Layer(Model):
     material_model = StainlessSteel
     coldfluid_model = Air
     hotfluid_model = Water
+    # running-sum pipe lengths: linear GP size, but may reach a different
+    # local optimum (see RectangularPipe)
+    cumulative_lengths = False
+    merge_aliases = False  # cells share the pipes' variables (smaller GPs)
 
     def setup(self, Ncoldpipes, Nhotpipes):
         self.Ncoldpipes = Ncoldpipes
@@ -46,20 +50,40 @@ class Layer(Model):
         exec parse_variables(Layer.__doc__)
 
         self.material = self.material_model()
-        with Vectorize(Nhotpipes):
-            with Vectorize(Ncoldpipes):
-                cells = self.cells = HXArea(n_fins, self.material)
 
         coldfluid = self.coldfluid_model()
         with Vectorize(Ncoldpipes):
             coldpipes = RectangularPipe(Nhotpipes, n_fins, coldfluid,
-                                        increasingT=True)
+                                        increasingT=True,
+                                        cumulative=self.cumulative_lengths)
         self.coldpipes = coldpipes
         hotfluid = self.hotfluid_model()
         with Vectorize(Nhotpipes):
             hotpipes = RectangularPipe(Ncoldpipes, n_fins, hotfluid,
-                                       increasingT=False)
+                                       increasingT=False,
+                                       cumulative=self.cumulative_lengths)
         self.hotpipes = hotpipes
+
+        # cell variables equal to a pipe variable, as [Ncold, Nhot] arrays
+        shared = OrderedDict([
+            ("dQ", hotpipes.dQ), ("Tr_hot", hotpipes.Tr_int),
+            ("Tr_cld", coldpipes.Tr_int.T), ("T_hot", hotpipes.T_avg),
+            ("T_cld", coldpipes.T_avg.T), ("h_hot", hotpipes.h),
+            ("h_cld", coldpipes.h.T), ("z_hot", hotpipes.h_seg),
+            ("z_cld", coldpipes.h_seg.T), ("x_cell", coldpipes.l_seg.T),
+            ("y_cell", hotpipes.l_seg)])
+        with Vectorize(Nhotpipes):
+            with Vectorize(Ncoldpipes):
+                cells = self.cells = HXArea(
+                    n_fins, self.material,
+                    shared if self.merge_aliases else None)
+        if self.merge_aliases:
+            links = [hotpipes.dQ == coldpipes.dQ.T]
+        else:
+            links = [getattr(cells, name) == var
+                     for name, var in shared.items()]
+            links.append(cells.dQ == coldpipes.dQ.T)
+
         pipes = [
             coldpipes,
             coldpipes.T_in == T_in_cold, coldpipes.v_in == v_in_cold,
@@ -98,39 +122,24 @@ class Layer(Model):
 
         geom = [
             V_tot >= hotpipes.V_seg.sum() + coldpipes.V_seg.sum() + V_mtrl,
-            cells.x_cell == coldpipes.l_seg.T,
-            cells.y_cell == hotpipes.l_seg,
+            links,
             maxAR >= cells.y_cell/cells.x_cell,
             maxAR >= cells.x_cell/cells.y_cell,
             # Differentiating between flow width and cell width
             cells.x_cell >= n_fins*(cells.t_hot + hotpipes.w_fluid),
             cells.y_cell >= n_fins*(cells.t_cld + coldpipes.w_fluid.T),
             n_fins >= 1.,  # Making sure there is at least 1 fin
-            cells.dQ == hotpipes.dQ,
-            cells.dQ == coldpipes.dQ.T,
-            cells.Tr_hot == hotpipes.Tr_int,
-            cells.Tr_cld == coldpipes.Tr_int.T,
-            cells.T_hot == hotpipes.T_avg,
-            cells.T_cld == coldpipes.T_avg.T,
-            cells.h_hot == hotpipes.h,
-            cells.h_cld == coldpipes.h.T,
-            cells.z_hot == hotpipes.h_seg,
-            cells.z_cld == coldpipes.h_seg.T,
             x_dim >= hotpipes.w.sum(),
             y_dim >= coldpipes.w.sum(),
             z_dim >= cells.z_hot + cells.z_cld + cells.t_plate,
             T_max_hot >= cells.T_hot[-1, :],
             T_min_cold <= cells.T_cld[:, -1],
-            T_min_cold <= T_max_hot
+            T_min_cold <= T_max_hot,
+            # cell widths match pipe widths (broadcast over the grid)
+            cells.x_cell == hotpipes.w,
+            cells.y_cell.T == coldpipes.w,
         ]
 
-        for j in range(Nhotpipes):
-            for i in range(Ncoldpipes):
-                geom.extend([
-                    cells.x_cell[i, j] == hotpipes.w[j],
-                    cells.y_cell[i, j] == coldpipes.w[i],
-                ])
-
         with SignomialsEnabled():
             SP_Qsum = Q <= cells.dQ.sum()
 
@@ -0,0 +1,95 @@
+"LRU cache of built Layer templates, keyed by grid size"
+from collections import OrderedDict
+from layer import Layer
+from presolve import presolve
+
+# rough footprint of one built cell or pipe segment (variables, constraints)
+BYTES_PER_CELL = 60e3
+
+
+def est_bytes(Ncoldpipes, Nhotpipes):
+    "Approximate memory held by a built Layer of the given grid size"
+    return BYTES_PER_CELL*(Ncoldpipes*Nhotpipes + Ncoldpipes + Nhotpipes)
+
+
+def copysubs(substitutions):
+    "Copies a substitutions dict so in-place vector edits don't leak"
+    return dict((k, v.copy() if hasattr(v, "copy") else v)
+                for k, v in substitutions.items())
+
+
+class LayerCache(object):
+    """Keeps built Layer models per (Ncoldpipes, Nhotpipes)
+
+    Arguments
+    ---------
+    maxbytes : float
+        approximate memory cap; least recently used templates are evicted
+        once the estimated total exceeds it (the newest is always kept)
+    model : Model class
+        the Layer (sub)class to build
+    presolve : bool
+        if True, variables fixed by the constants are substituted (see
+        presolve.py) after the design parameters are applied; the last
+        report is kept in self.presolved
+    """
+    def __init__(self, maxbytes=500e6, model=Layer, presolve=False):
+        self.maxbytes = maxbytes
+        self.model = model
+        self.presolve = presolve
+        self.presolved = None
+        self.templates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.templates)
+
+    def __contains__(self, gridsize):
+        return gridsize in self.templates
+
+    def build(self, Ncoldpipes, Nhotpipes):
+        "Constructs a new template and records its default substitutions"
+        m = self.model(Ncoldpipes, Nhotpipes)
+        m.cost = 1/m.Q
+        return m, copysubs(m.substitutions)
+
+    def get(self, Ncoldpipes, Nhotpipes, design_parameters=None):
+        """Returns a Layer with default substitutions plus design_parameters
+
+        design_parameters maps names in Layer.design_parameters to values;
+        unknown names are reported and skipped.
+        """
+        gridsize = (Ncoldpipes, Nhotpipes)
+        if gridsize in self.templates:
+            m, defaults = self.templates.pop(gridsize)
+            self.hits += 1
+        else:
+            m, defaults = self.build(Ncoldpipes, Nhotpipes)
+            self.misses += 1
+        self.templates[gridsize] = (m, defaults)
+        self.evict()
+
+        # (KeyDict.clear keeps the key map, which breaks later element
+        # substitutions such as presolve's)
+        for key in list(m.substitutions.keys()):
+            del m.substitutions[key]
+        m.substitutions.update(copysubs(defaults))
+        for name, value in (design_parameters or {}).items():
+            try:
+                key = m.design_parameters[name]
+                m.substitutions[key] = value
+            except KeyError as e:
+                print repr(e)
+        if self.presolve:
+            self.presolved = presolve(m)
+        return m
+
+    def nbytes(self):
+        "Estimated memory held by all cached templates"
+        return sum(est_bytes(*gridsize) for gridsize in self.templates)
+
+    def evict(self):
+        "Drops least recently used templates until under the memory cap"
+        while len(self.templates) > 1 and self.nbytes() > self.maxbytes:
+            self.templates.popitem(last=False)
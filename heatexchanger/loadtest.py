@@ -0,0 +1,59 @@
+"""Simulates several ESP clients against a running asyncserver
+
+Requires the websocket-client package. Each client sends a burst of
+slider changes, waits for the optimal reply to its newest one, and
+records the latency.
+"""
+import json
+import random
+import threading
+from time import time, sleep
+from websocket import create_connection
+
+
+def client(url, nrequests, burst, results, seed):
+    "Sends nrequests bursts of design changes, timing each final reply"
+    rng = random.Random(seed)
+    ws = create_connection(url)
+    latencies = []
+    try:
+        for _ in range(nrequests):
+            for _ in range(burst):
+                ws.send(json.dumps({
+                    "Cold_Channels": 3, "Hot_Channels": 3,
+                    "Ti_hotfluid": rng.uniform(400, 500),
+                    "vi_coldfluid": rng.uniform(10, 30)}))
+                sleep(0.05)
+            start = time()
+            while True:
+                reply = json.loads(ws.recv())
+                if reply["status"] in ("optimal", "unknown"):
+                    latencies.append((time() - start, reply["status"]))
+                    break
+    finally:
+        ws.close()
+    results.append(latencies)
+
+
+def loadtest(url="ws://localhost:8000/", nclients=4, nrequests=3, burst=3):
+    "Runs nclients simulated clients at once; prints latency statistics"
+    results = []
+    threads = [threading.Thread(target=client,
+                                args=(url, nrequests, burst, results, i))
+               for i in range(nclients)]
+    start = time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies = sorted(t for r in results for t, _ in r)
+    failures = sum(status != "optimal" for r in results for _, status in r)
+    print "%i clients, %i replies (%i failed) in %.1fs" % (
+        nclients, len(latencies), failures, time() - start)
+    if latencies:
+        print "latency: median %.2fs, max %.2fs" % (
+            latencies[len(latencies)//2], latencies[-1])
+
+
+if __name__ == "__main__":
+    loadtest()
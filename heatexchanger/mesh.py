@@ -0,0 +1,100 @@
+"""Triangle mesh export of a solved Layer, without the ESP toolchain
+
+Each cell becomes a separating plate with the hot fins above it (running
+along y, the hot flow direction) and the cold fins below it (running
+along x). Every plate and fin is a box, and all boxes are triangulated
+at once. Coordinates are in meters; the plates sit at z = 0.
+"""
+import numpy as np
+from rating import si
+
+# unit cube corners (corner i has x, y, z = bits 0, 1, 2 of i) and its
+# 12 triangles, counterclockwise seen from outside
+CUBE = np.array([[i & 1, (i >> 1) & 1, (i >> 2) & 1] for i in range(8)],
+                dtype=float)
+FACES = np.array([[0, 2, 1], [1, 2, 3], [4, 5, 6], [5, 7, 6],
+                  [0, 1, 4], [1, 5, 4], [2, 6, 3], [3, 6, 7],
+                  [0, 4, 2], [2, 4, 6], [1, 3, 5], [3, 7, 5]])
+STL_RECORD = np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)),
+                       ("attr", "<u2")])
+
+
+def boxes(m, sol):
+    """Lower and upper corners [nboxes, 3] of every plate and fin of m
+
+    n_fins is rounded to the nearest whole number of fins per cell.
+    """
+    c = m.cells
+    x_cell, y_cell = si(sol, c.x_cell, "m"), si(sol, c.y_cell, "m")
+    z_hot, z_cld = si(sol, c.z_hot, "m"), si(sol, c.z_cld, "m")
+    t_plate = si(sol, c.t_plate, "m")
+    t_hot, t_cld = si(sol, c.t_hot, "m"), si(sol, c.t_cld, "m")
+    n_fins = max(1, int(round(float(si(sol, m.n_fins)))))
+    # cell origins: hot channels side by side in x, cold channels in y
+    x0 = np.cumsum(x_cell, axis=1) - x_cell
+    y0 = np.cumsum(y_cell, axis=0) - y_cell
+    zero = np.zeros_like(x0)
+    plates = ([x0, y0, zero], [x0 + x_cell, y0 + y_cell, t_plate])
+    # fin centres at (k + 1/2)/n_fins of the cell width
+    frac = ((np.arange(n_fins) + 0.5)/n_fins)[:, np.newaxis, np.newaxis]
+    xc = x0 + frac*x_cell - t_hot/2
+    yc = y0 + frac*y_cell - t_cld/2
+    hotfins = ([xc, y0 + 0*frac, t_plate + 0*frac],
+               [xc + t_hot, y0 + y_cell + 0*frac, t_plate + z_hot + 0*frac])
+    coldfins = ([x0 + 0*frac, yc, -z_cld + 0*frac],
+                [x0 + x_cell + 0*frac, yc + t_cld, zero + 0*frac])
+    lo, hi = [np.concatenate([np.column_stack([np.ravel(a) for a in part])
+                              for part in parts])
+              for parts in zip(plates, hotfins, coldfins)]
+    return lo, hi
+
+
+def triangulate(lo, hi):
+    "Vertices [nboxes*8, 3] and triangles [nboxes*12, 3] of boxes"
+    verts = lo[:, np.newaxis, :] + (hi - lo)[:, np.newaxis, :]*CUBE
+    faces = FACES + 8*np.arange(len(lo))[:, np.newaxis, np.newaxis]
+    return verts.reshape(-1, 3), faces.reshape(-1, 3)
+
+
+def write_stl(filename, verts, faces):
+    "Writes a binary STL file"
+    tris = verts[faces]
+    normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    lengths = np.sqrt((normals**2).sum(axis=1))[:, np.newaxis]
+    records = np.zeros(len(tris), dtype=STL_RECORD)
+    records["normal"] = normals/np.where(lengths > 0, lengths, 1)
+    records["vertices"] = tris
+    with open(filename, "wb") as f:
+        f.write(b"heat exchanger layer".ljust(80, b" "))
+        np.array([len(tris)], dtype="<u4").tofile(f)
+        records.tofile(f)
+
+
+def write_obj(filename, verts, faces):
+    "Writes a Wavefront OBJ file"
+    with open(filename, "w") as f:
+        np.savetxt(f, verts, fmt="v %.6g %.6g %.6g")
+        np.savetxt(f, faces + 1, fmt="f %i %i %i")
+
+
+def export(m, sol, filename="HX.stl"):
+    "Writes the mesh of a solved Layer as STL or OBJ, by file extension"
+    verts, faces = triangulate(*boxes(m, sol))
+    if filename.lower().endswith(".obj"):
+        write_obj(filename, verts, faces)
+    else:
+        write_stl(filename, verts, faces)
+    return verts, faces
+
+
+if __name__ == "__main__":
+    from time import time
+    from layer import Layer
+    M = Layer(10, 10)
+    M.cost = 1/M.Q
+    SOL = M.localsolve(verbosity=0)
+    for FILENAME in ["HX.stl", "HX.obj"]:
+        START = time()
+        _, FACES_OUT = export(M, SOL, FILENAME)
+        print "%s: %i triangles in %.1f ms" % (FILENAME, len(FACES_OUT),
+                                               1e3*(time() - START))
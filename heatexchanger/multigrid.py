@@ -0,0 +1,139 @@
+"Maps Layer solutions between grid sizes for coarse-to-fine warm starts"
+import numpy as np
+from layer import Layer
+
+# exponents (a_cold, a_hot): value ~ Ncoldpipes^-a_cold * Nhotpipes^-a_hot
+CELL_SCALING = {"dQ": (1, 1), "x_cell": (0, 1), "y_cell": (1, 0),
+                "A_hot": (1, 0), "A_cld": (0, 1)}
+# exponents (a_across, a_along) for a pipe: across is its own pipe count,
+# along is the number of segments (the other fluid's pipe count)
+PIPE_SCALING = {"w": (1, 0), "w_fluid": (1, 0), "mdot": (1, 0),
+                "D": (1, 0), "A": (1, 0), "A_seg": (1, 0), "l_seg": (0, 1),
+                "V_seg": (1, 1), "dQ": (1, 1), "dT": (0, 1), "dP": (0, 1)}
+
+
+def varnames(model):
+    "Names of the variables declared in a model class's docstring"
+    names = []
+    insection = False
+    for line in (type(model).__doc__ or "").split("\n"):
+        line = line.strip()
+        if line.startswith("Variables"):
+            insection = True
+        elif not line:
+            insection = False
+        elif insection and not line.startswith("-"):
+            names.append(line.split()[0])
+    return names
+
+
+def values(sol, var):
+    """Returns the solution magnitudes of a Variable or array as an ndarray
+
+    Returns None if var is not part of the solved model.
+    """
+    try:
+        if not hasattr(var, "flat"):
+            return np.array(sol["variables"][var.key])
+        return np.array([sol["variables"][el.key]
+                         for el in var.flat]).reshape(var.shape)
+    except KeyError:
+        return None
+
+
+def resample(x, axis, n, nodes=False):
+    """Log-linearly resamples axis of x to n cells (n+1 values if nodes)
+
+    Cell values are taken to sit at cell centres, node values at the cell
+    boundaries, both over the unit interval.
+    """
+    nsrc = x.shape[axis]
+    ncells = nsrc - 1 if nodes else nsrc
+    offset = 0. if nodes else 0.5
+    xsrc = (np.arange(nsrc) + offset)/ncells
+    xdst = (np.arange(n + 1 if nodes else n) + offset)/n
+    return np.apply_along_axis(
+        lambda y: np.exp(np.interp(xdst, xsrc, np.log(y))), axis, x)
+
+
+def prolong(msrc, sol, mdst):
+    """Maps a solution of Layer msrc onto the (finer or coarser) Layer mdst
+
+    Per-cell HXArea and per-segment RectangularPipe variables are
+    interpolated along each grid direction, and extensive quantities
+    (widths, segment lengths, heat flows) are rescaled for the new channel
+    counts. Returns a dict suitable for localsolve's x0.
+    """
+    Nc0, Nh0 = msrc.Ncoldpipes, msrc.Nhotpipes
+    Nc1, Nh1 = mdst.Ncoldpipes, mdst.Nhotpipes
+    rc, rh = float(Nc0)/Nc1, float(Nh0)/Nh1
+    x0 = {}
+
+    def assign(var, x):
+        if x is None:
+            return
+        elif hasattr(var, "flat"):
+            for el, val in zip(var.flat, x.flat):
+                x0[el.key] = val
+        else:
+            x0[var.key] = float(x)
+
+    for name in varnames(mdst):
+        assign(getattr(mdst, name), values(sol, getattr(msrc, name)))
+
+    for name in varnames(mdst.cells):
+        x = values(sol, getattr(msrc.cells, name))
+        if x is None:
+            continue
+        x = resample(resample(x, 0, Nc1), 1, Nh1)
+        a_cold, a_hot = CELL_SCALING.get(name, (0, 0))
+        assign(getattr(mdst.cells, name), x * rc**a_cold * rh**a_hot)
+
+    for pipes, (r_across, r_along), (n_across, n_along), nsegments in [
+            ("coldpipes", (rc, rh), (Nc1, Nh1), Nh0),
+            ("hotpipes", (rh, rc), (Nh1, Nc1), Nc0)]:
+        src, dst = getattr(msrc, pipes), getattr(mdst, pipes)
+        for name in varnames(dst):
+            x = values(sol, getattr(src, name))
+            if x is None:
+                continue
+            # per-segment arrays are (segment, pipe); per-pipe are (pipe,)
+            x = resample(x, x.ndim - 1, n_across)
+            if x.ndim > 1:
+                x = resample(x, 0, n_along, nodes=x.shape[0] > nsegments)
+            a_across, a_along = PIPE_SCALING.get(name, (0, 0))
+            assign(getattr(dst, name), x * r_across**a_across
+                   * r_along**a_along)
+    return x0
+
+
+def gridsizes(Ncoldpipes, Nhotpipes, coarsest=4):
+    "Halves a grid size until coarsest is reached, coarsest first"
+    sizes = [(Ncoldpipes, Nhotpipes)]
+    while max(sizes[-1]) > coarsest:
+        Nc, Nh = sizes[-1]
+        sizes.append((max(1, (Nc + 1)//2), max(1, (Nh + 1)//2)))
+    return sizes[::-1]
+
+
+def multigrid_solve(Ncoldpipes, Nhotpipes, design_parameters=None,
+                    coarsest=4, verbosity=0, model=Layer):
+    """Solves e.g. 4x4, then 8x8, then 16x16, prolonging each as x0
+
+    design_parameters maps names in Layer.design_parameters to values and
+    is applied at every level. Returns the finest (model, solution).
+    """
+    m = sol = None
+    for Nc, Nh in gridsizes(Ncoldpipes, Nhotpipes, coarsest):
+        mnew = model(Nc, Nh)
+        mnew.cost = 1/mnew.Q
+        for name, value in (design_parameters or {}).items():
+            if name in ("Cold_Channels", "Hot_Channels"):
+                continue
+            mnew.substitutions[mnew.design_parameters[name]] = value
+        x0 = prolong(m, sol, mnew) if m is not None else None
+        if verbosity:
+            print "Solving %ix%i layer" % (Nc, Nh)
+        sol = mnew.localsolve(x0=x0, verbosity=max(0, verbosity - 1))
+        m = mnew
+    return m, sol
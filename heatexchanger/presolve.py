@@ -0,0 +1,86 @@
+"""Constant folding: substitutes variables that constants already fix
+
+Monomial equalities whose other variables are all substituted fix their
+last variable, e.g. every pipe's Pr == mu*c/k from the fluid properties,
+or every cell's t_plate == t_min. Substituting those values before
+compilation lets gpkit drop the variables and the (now constant)
+equalities from every GP. Values propagate: a fixed pipe T_in in turn
+fixes T[0]. The optimum is unchanged, but the constants' sensitivities
+are shared with the derived substitutions.
+"""
+import numpy as np
+from gpkit.nomials import MonomialEquality
+
+
+def numeric(key, value):
+    "A substitution as a float in key's units, or None if not a constant"
+    if hasattr(value, "to"):
+        value = (value.to(key.units).magnitude if key.units
+                 else value.magnitude)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):  # sweeps, linked functions
+        return None
+    return None if np.isnan(value) else value
+
+
+def gp_size(m):
+    "(variables, constraints, monomials) of m's first GP approximation"
+    gp = m.sp().gp()
+    return len(gp.varlocs), len(gp.hmaps) - 1, len(gp.cs)
+
+
+def presolve(m, maxpasses=20, measure=False):
+    """Substitutes every variable of m fixed by its constants and monomial
+    equalities (except variables in the cost)
+
+    Returns {"substituted": count}. With measure, m is also compiled
+    before and after, and the report holds what its GPs lost: {"variables",
+    "constraints", "monomials"}. Presolved values are plain substitutions,
+    so they are reset along with the others (e.g. by LayerCache.get) and
+    must then be presolved again.
+    """
+    before = gp_size(m) if measure else None
+    protected = set(m.cost.varkeys)
+    known = {}
+
+    def value(key):
+        if key not in known:
+            try:
+                known[key] = numeric(key, m.substitutions[key])
+            except KeyError:
+                known[key] = None
+        return known[key]
+
+    # each equality as coeff * prod(x**exp) == 1
+    pending = []
+    for constraint in m.flat(constraintsets=False):
+        if isinstance(constraint, MonomialEquality):
+            p = constraint.as_posyslt1()[0]
+            coeff = float(getattr(p.cs[0], "magnitude", p.cs[0]))
+            pending.append((coeff, dict(p.exps[0])))
+
+    derived = {}
+    for _ in range(maxpasses):
+        remaining = []
+        for coeff, exp in pending:
+            unknown = [key for key in exp if value(key) is None]
+            if len(unknown) == 1 and unknown[0] not in protected:
+                key = unknown[0]
+                rest = coeff*np.prod([value(k)**x for k, x in exp.items()
+                                      if k != key])
+                known[key] = derived[key] = float(rest**(-1./exp[key]))
+            elif unknown:  # (equalities of constants only are dropped)
+                remaining.append((coeff, exp))
+        if len(remaining) == len(pending):
+            break
+        pending = remaining
+
+    for key, val in derived.items():
+        m.substitutions[key] = val
+    report = {"substituted": len(derived)}
+    if measure:
+        after = gp_size(m)
+        report.update(zip(["variables", "constraints", "monomials"],
+                          [b - a for b, a in zip(before, after)]))
+    return report
@@ -0,0 +1,126 @@
+"Per-phase timing records for Layer solves"
+import json
+from time import time
+from contextlib import contextmanager
+from gpkit.solution_array import SolutionArray
+from layer import Layer
+
+
+@contextmanager
+def gp_timer(program, iterations, callback=None):
+    """Appends a timing entry to iterations for every GP that the compiled
+    SP program solves in the block
+
+    If given, callback is called with each entry (which then also holds
+    the GP's cost) as soon as that GP is solved. Only this program's GPs
+    are timed: the GPs it generates get a timed solve of their own.
+    """
+    last = [time()]
+
+    def timed(solve):
+        def timed_solve(*args, **kwargs):
+            start = time()
+            result = None
+            try:
+                result = solve(*args, **kwargs)
+                return result
+            finally:
+                end = time()
+                gp = solve.__self__
+                iterations.append({"approximate": start - last[0],
+                                   "solve": end - start,
+                                   "monomials": len(gp.cs),
+                                   "variables": len(gp.varlocs)})
+                last[0] = end
+                if callback and result is not None:
+                    iterations[-1]["cost"] = result["cost"]
+                    callback(iterations[-1])
+        return timed_solve
+
+    approximation = program.gp
+
+    def timed_gp(*args, **kwargs):
+        gp = approximation(*args, **kwargs)
+        if "solve" not in vars(gp):  # the SP may reuse its GP
+            gp.solve = timed(gp.solve)
+        return gp
+
+    program.gp = timed_gp
+    try:
+        yield last
+    finally:
+        del program.gp
+
+
+def solve_compiled(m, program, **solveargs):
+    """Locally solves m's compiled SP program, returning the solution as
+    m.localsolve would"""
+    sol = SolutionArray()
+    sol.append(program.localsolve(**solveargs))
+    sol.program = program
+    sol.to_arrays()
+    if m.cost.units:
+        sol["cost"] = sol["cost"]*m.cost.units
+    m.program, m.solution = program, sol
+    return sol
+
+
+def profiled_localsolve(m, **solveargs):
+    """Solves m, returning (record, solution)
+
+    record holds compile time (building the SP from the model), one entry
+    per GP iteration (time spent forming the local approximation and in
+    the solver, plus its size), solution assembly time and totals.
+    """
+    record = {"Ncoldpipes": getattr(m, "Ncoldpipes", None),
+              "Nhotpipes": getattr(m, "Nhotpipes", None),
+              "iterations": []}
+    start = time()
+    program = m.sp()
+    record["compile"] = time() - start
+    with gp_timer(program, record["iterations"]) as last:
+        sol = solve_compiled(m, program, **solveargs)
+    end = time()
+    iterations = record["iterations"]
+    if iterations:
+        record["variables"] = iterations[-1]["variables"]
+        record["monomials"] = iterations[-1]["monomials"]
+    record["niterations"] = len(iterations)
+    record["assembly"] = end - last[0]
+    record["solve"] = end - start
+    record["cost"] = float(getattr(sol["cost"], "magnitude", sol["cost"]))
+    return record, sol
+
+
+def profile_solve(Ncoldpipes, Nhotpipes, design_parameters=None,
+                  jsonl=None, model=Layer, **solveargs):
+    """Builds and solves a Layer, timing every phase
+
+    Returns (record, model, solution); if jsonl is a filename the record
+    is appended to it as one JSON line.
+    """
+    start = time()
+    m = model(Ncoldpipes, Nhotpipes)
+    m.cost = 1/m.Q
+    for name, value in (design_parameters or {}).items():
+        m.substitutions[m.design_parameters[name]] = value
+    build = time() - start
+    solveargs.setdefault("verbosity", 0)
+    record, sol = profiled_localsolve(m, **solveargs)
+    record["build"] = build
+    record["total"] = build + record["solve"]
+    if jsonl:
+        with open(jsonl, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    return record, m, sol
+
+
+if __name__ == "__main__":
+    for N in [2, 4, 6, 8, 10]:
+        RECORD, _, _ = profile_solve(N, N, jsonl="profile.jsonl")
+        print ("%2ix%-2i build %.2fs compile %.2fs %2i GPs %.2fs"
+               " assembly %.2fs" % (
+                   N, N, RECORD["build"], RECORD["compile"],
+                   RECORD["niterations"],
+                   sum(it["solve"] for it in RECORD["iterations"]),
+                   RECORD["assembly"]))
@@ -0,0 +1,195 @@
+"""Pure-NumPy forward rating of a fixed Layer geometry
+
+Applies the RectangularPipe correlations (Re, Cf, Nu, h and the eta_h and
+Pf fits) and the HXArea wall-conduction model cell by cell, marching the
+hot and cold streams across the cross-flow grid. Every operating-point
+quantity may be an array, in which case all points are rated at once.
+All values are in SI units.
+
+It is the model's own treatment, not a more physical one: the reference
+flow lengths l that set Re and h are only bounded above by the distance
+from the inlet in RectangularPipe, and the inlet flow areas A[0] that
+set the mass flows only through the segments' mean areas, so both are
+design variables, taken from the solution. (The optimizer shrinks l in
+some cells to raise h; rating the same cells with the physical lengths
+gives a much lower Q.) Each cell transfers the most heat its HXArea and
+pipe constraints allow, with arithmetic rather than geometric mean
+temperatures. The model's temperature drops are only lower bounds, so
+where a limit like T_max_hot is active its outlet temperatures are not
+reproduced; Q and the drags are, to within about a percent.
+"""
+import numpy as np
+from correlations import value
+
+GEOMETRY = ["x_cell", "y_cell", "z_hot", "z_cld", "t_hot", "t_cld",
+            "w_fluid_hot", "w_fluid_cld", "l_hot", "l_cld", "A_in_hot",
+            "A_in_cld", "n_fins"]
+
+
+def si(sol, var, unit=None):
+    "Solution value(s) of var as a float array, converted to unit"
+    x = sol(var)
+    if unit:
+        x = x.to(unit)
+    return np.asarray(getattr(x, "magnitude", x), dtype=float)
+
+
+def geometry(m, sol):
+    "Extracts the cell geometry of a solved Layer (arrays [Ncold, Nhot])"
+    c = m.cells
+    return {"x_cell": si(sol, c.x_cell, "m"),
+            "y_cell": si(sol, c.y_cell, "m"),
+            "z_hot": si(sol, c.z_hot, "m"),
+            "z_cld": si(sol, c.z_cld, "m"),
+            "t_hot": si(sol, c.t_hot, "m"),
+            "t_cld": si(sol, c.t_cld, "m"),
+            "w_fluid_hot": si(sol, m.hotpipes.w_fluid, "m"),
+            "w_fluid_cld": si(sol, m.coldpipes.w_fluid, "m").T,
+            "l_hot": si(sol, m.hotpipes.l, "m"),
+            "l_cld": si(sol, m.coldpipes.l, "m").T,
+            "A_in_hot": si(sol, m.hotpipes.A, "m^2")[:1, :],
+            "A_in_cld": si(sol, m.coldpipes.A, "m^2")[:1, :].T,
+            "n_fins": float(si(sol, m.n_fins))}
+
+
+def operating_point(m, sol):
+    "The operating point and properties a Layer was solved at"
+    cf, hf, mtrl = m.coldpipes.fluid, m.hotpipes.fluid, m.material
+    op = {"T_in_hot": si(sol, m.T_in_hot, "K"),
+          "T_in_cold": si(sol, m.T_in_cold, "K"),
+          "v_in_hot": si(sol, m.v_in_hot, "m/s"),
+          "v_in_cold": si(sol, m.v_in_cold, "m/s"),
+          "k_metal": si(sol, mtrl.k, "W/m/K")}
+    for side, fluid in [("hot", hf), ("cold", cf)]:
+        op["rho_" + side] = si(sol, fluid.rho, "kg/m^3")
+        op["c_" + side] = si(sol, fluid.c, "J/kg/K")
+        op["mu_" + side] = si(sol, fluid.mu, "Pa*s")
+        op["k_" + side] = si(sol, fluid.k, "W/m/K")
+    # factors on the fits and their Re, 1 as in the model (for uncertainty)
+    for name in ["eta_h_factor", "Pf_factor", "Re_factor"]:
+        op[name] = 1.
+    return op
+
+
+def eta_h_fit(Re, eta_h_factor=1., Re_factor=1.):
+    "RectangularPipe effectiveness fit, capped at its validity bound"
+    return np.minimum(eta_h_factor*value("eta_h", Re/Re_factor), 0.844)
+
+
+def Pf_fit(Re, Pf_factor=1., Re_factor=1.):
+    "RectangularPipe pressure drop parameter fit"
+    return Pf_factor*value("Pf", Re/Re_factor)
+
+
+def channel(rho, mu, k, c, v_in, A_in, area, flowlength, n_fins):
+    """Per-segment velocity, Re, Cf and h for channels
+
+    A_in is per-channel, area and flowlength (the reference lengths l)
+    per-cell; returns (mdot, v_avg, Re, Cf, h).
+    """
+    mdot = n_fins*rho*v_in*A_in
+    v_avg = mdot/(n_fins*rho*area)
+    Re = rho*v_avg*flowlength/mu
+    Cf = 0.059/Re**0.2
+    Pr = mu*c/k
+    Nu = 0.0296*Re**0.8*Pr**(1./3)
+    return mdot, v_avg, Re, Cf, Nu*k/flowlength
+
+
+def rate(geom, **op):
+    """Rates a geometry at one or many operating points
+
+    geom is as returned by geometry(); op as from operating_point(), where
+    any entry may be an array of npoints values. Geometry arrays may also
+    carry a leading npoints axis (e.g. sampled thicknesses). Returns a
+    dict of Q, D_hot, D_cold [npoints], T_out_hot [npoints, Nhot],
+    T_out_cold [npoints, Ncold], dQ [npoints, Ncold, Nhot] and the fluid
+    pressure drop over each channel, dP_hot and dP_cold.
+    """
+    g = {}
+    for k in GEOMETRY[:-1]:
+        g[k] = np.asarray(geom[k], dtype=float)
+        if g[k].ndim == 2:
+            g[k] = g[k][np.newaxis]
+    npoints = max([np.size(v) for v in op.values()]
+                  + [v.shape[0] for v in g.values()])
+    op = dict((k, np.asarray(v, dtype=float)*np.ones(npoints))
+              for k, v in op.items())
+    op = dict((k, v.reshape(npoints, 1, 1)) for k, v in op.items())
+    n_fins = geom["n_fins"]
+    Ncold, Nhot = g["x_cell"].shape[1:]
+
+    # hot fluid flows along y (axis 1), cold fluid along x (axis 2)
+    A_hot_ch = g["w_fluid_hot"]*g["z_hot"]
+    A_cld_ch = g["w_fluid_cld"]*g["z_cld"]
+    mdot_h, v_h, Re_h, Cf_h, h_h = channel(
+        op["rho_hot"], op["mu_hot"], op["k_hot"], op["c_hot"],
+        op["v_in_hot"], g["A_in_hot"], A_hot_ch, g["l_hot"], n_fins)
+    mdot_c, v_c, Re_c, Cf_c, h_c = channel(
+        op["rho_cold"], op["mu_cold"], op["k_cold"], op["c_cold"],
+        op["v_in_cold"], g["A_in_cld"], A_cld_ch, g["l_cld"], n_fins)
+
+    eta_h = eta_h_fit(Re_h[:, -1:, :], op["eta_h_factor"], op["Re_factor"])
+    eta_c = eta_h_fit(Re_c[:, :, -1:], op["eta_h_factor"], op["Re_factor"])
+    Pf_h = Pf_fit(Re_h[:, -1:, :], op["Pf_factor"], op["Re_factor"])
+    Pf_c = Pf_fit(Re_c[:, :, -1:], op["Pf_factor"], op["Re_factor"])
+    D_hot = (Pf_h*0.5*op["rho_hot"]*op["v_in_hot"]**2
+             * n_fins*A_hot_ch[:, :1, :]).sum(axis=(1, 2))
+    D_cold = (Pf_c*0.5*op["rho_cold"]*op["v_in_cold"]**2
+              * n_fins*A_cld_ch[:, :, :1]).sum(axis=(1, 2))
+    dh_h = 2*A_hot_ch/np.sqrt(A_hot_ch)
+    dh_c = 2*A_cld_ch/np.sqrt(A_cld_ch)
+    dP_hot = (0.5*op["rho_hot"]*v_h**2*Cf_h*g["y_cell"]/dh_h).sum(axis=1)
+    dP_cold = (0.5*op["rho_cold"]*v_c**2*Cf_c*g["x_cell"]/dh_c).sum(axis=2)
+
+    # cell conductances: convection on each side, fin conduction between
+    hA_hot = h_h*2*n_fins*g["y_cell"]*g["z_hot"]
+    hA_cld = h_c*2*n_fins*g["x_cell"]*g["z_cld"]
+    R_fins = (0.33*g["z_hot"]/(n_fins*op["k_metal"]*g["t_hot"]*g["y_cell"])
+              + 0.33*g["z_cld"]/(n_fins*op["k_metal"]*g["t_cld"]
+                                 * g["x_cell"]))
+    C_h = (mdot_h*op["c_hot"])[:, 0, :]
+    C_c = (mdot_c*op["c_cold"])[:, :, 0]
+    eta_h, eta_c = eta_h[:, 0, :], eta_c[:, :, 0]
+
+    T_hot = np.empty((npoints, Ncold + 1, Nhot))
+    T_cld = np.empty((npoints, Ncold, Nhot + 1))
+    T_hot[:, 0, :] = op["T_in_hot"][:, 0]
+    T_cld[:, :, 0] = op["T_in_cold"][:, 0]
+    dQ = np.empty((npoints, Ncold, Nhot))
+    # march along anti-diagonals: cell (i, j) needs (i-1, j) and (i, j-1)
+    for d in range(Ncold + Nhot - 1):
+        i = np.arange(max(0, d - Nhot + 1), min(Ncold - 1, d) + 1)
+        j = d - i
+        th, tc = T_hot[:, i, j], T_cld[:, i, j]
+        ch, cc = C_h[:, j], C_c[:, i]
+        # each stream's resistance down to its wall is the larger of the
+        # convective one (from the mean cell temperature) and that of its
+        # effectiveness bound (RectangularPipe, on the wall temperature)
+        r_h = np.maximum(1/hA_hot[:, i, j] + 0.5/ch, 1/(eta_h[:, j]*ch))
+        r_c = np.maximum(1/hA_cld[:, i, j] + 0.5/cc, 1/(eta_c[:, i]*cc))
+        dq = (th - tc)/(r_h + r_c + R_fins[:, i, j])
+        dQ[:, i, j] = dq
+        T_hot[:, i + 1, j] = th - dq/ch
+        T_cld[:, i, j + 1] = tc + dq/cc
+
+    return {"Q": dQ.sum(axis=(1, 2)), "dQ": dQ,
+            "T_out_hot": T_hot[:, -1, :], "T_out_cold": T_cld[:, :, -1],
+            "D_hot": D_hot, "D_cold": D_cold,
+            "dP_hot": dP_hot, "dP_cold": dP_cold}
+
+
+if __name__ == "__main__":
+    from time import time
+    from layer import Layer
+    M = Layer(4, 4)
+    M.cost = 1/M.Q
+    SOL = M.localsolve(verbosity=0)
+    GEOM, OP = geometry(M, SOL), operating_point(M, SOL)
+    print "optimized Q %.1f W, rated Q %.1f W" % (
+        si(SOL, M.Q, "W"), rate(GEOM, **OP)["Q"][0])
+    OP["T_in_hot"] = np.linspace(350, 500, 10000)
+    START = time()
+    OUT = rate(GEOM, **OP)
+    print "rated %i operating points in %.1f ms" % (
+        len(OUT["Q"]), 1e3*(time() - START))
@@ -1,9 +1,17 @@
-from gpkit import Model, parse_variables, SignomialsEnabled, units
+from gpkit import (Model, parse_variables, SignomialsEnabled, units,
+                   VectorVariable)
+import correlations
 
 
 class RectangularPipe(Model):
     """Defines heat exchanger pipe elements and fluid-wall interactions
 
+    With cumulative=True each segment's reference length l is bounded by
+    a running sum l_cum of the segment lengths rather than by the partial
+    sums themselves. The feasible set is the same, but the SP is
+    linearized differently and from the same initial guess can converge
+    to another local optimum (2x2 Layer: Q of 405.7 W vs. 430.0 W).
+
     Variables
     ---------
     mdot                 [kg/s]   mass flow rate
@@ -15,10 +23,7 @@ class RectangularPipe(Model):
     P_out        101000  [Pa]     output static pressure
     D                    [N]      total drag
     eta_h                [-]      effectiveness
-    eta_h_ref     0.917  [-]      reference effectiveness
     Pf                   [-]      pressure drop parameter
-    Pf_ref        21.66  [-]      reference pressure drop parameter
-    Re_ref        90550  [-]      reference Reynolds number
     Pr                   [-]      Prandtl number
     fr                   [Pa]     force per frontal area
 
@@ -60,9 +65,10 @@ class RectangularPipe(Model):
     Tr_int (if not increasingT), T_in (if increasingT)
 
     """
-    def setup(self, Nsegments, Nfins, fluid, increasingT):
+    def setup(self, Nsegments, Nfins, fluid, increasingT, cumulative=False):
         self.fluid = fluid
         self.increasingT = increasingT
+        self.cumulative = cumulative
 
         exec parse_variables(RectangularPipe.__doc__)
         self.Re_notlast = Re[:-1]  # unbounded b/c only Re[-1] is fit
@@ -100,12 +106,11 @@ class RectangularPipe(Model):
                 dP == 0.5 * fluid.rho * v_avg**2 * Cf * l_seg / dh,
 
                 # effectiveness fit
-                eta_h / eta_h_ref == 0.799 * (Re[-1]/Re_ref)**-0.0296,
+                correlations.constraints("eta_h", Re[-1], eta_h),
                 eta_h <= 0.844,  # boundary to make sure fit is valid
 
                 # pressure drop fit
-                (Pf/Pf_ref)**0.155 >= (0.475*(Re[-1]/Re_ref)**0.00121
-                                       + 0.0338*(Re[-1]/Re_ref)**-0.336),
+                correlations.constraints("Pf", Re[-1], Pf),
 
                 D >= fr * Nfins * A_seg[0]
             ]
@@ -119,8 +124,18 @@ class RectangularPipe(Model):
             h_seg >= 0.1*units('cm'),
         ]
         with SignomialsEnabled():
-            for i in range(Nsegments):
-                geom.extend([l[i] <= l_seg[:i + 1].sum()])
+            if cumulative:
+                # running sum: one signomial per segment instead of O(N^2)
+                l_cum = self.l_cum = VectorVariable(
+                    Nsegments, "l_cum", "cm",
+                    "Cumulative flow length at segment exit")
+                geom.extend([l <= l_cum,
+                             l_cum[0] <= l_seg[0]])
+                if Nsegments > 1:
+                    geom.extend([l_cum[1:] <= l_cum[:-1] + l_seg[1:]])
+            else:
+                for i in range(Nsegments):
+                    geom.extend([l[i] <= l_seg[:i + 1].sum()])
 
         # Friction and heat transfer
         friction = [
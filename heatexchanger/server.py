@@ -1,28 +1,187 @@
 from SimpleWebSocketServer import SimpleWebSocketServer, WebSocket
 import json
-from layer import Layer
-from gencsm import gencsm
-from shutil import copyfile
-
-EXIT = [False]
-ID = 0
-LASTSOL = [None]
-
-
-def genfiles(m, sol):
-    global ID
-    gensoltxt(m, sol, ID)
-    gencsm(m, sol, ID)
-    copyfile("HX.csm", "HX_%03i.csm" % ID)
-    ID += 1
-
-
-def gensoltxt(m, sol, ID):
-    with open("sol_%03i.txt" % ID, "w") as f:
-        for var in sorted(m.varkeys, key=str):
-            f.write("%s [%s]\t\t%f\n" % (var, var.unitstr(options=":~",
-                                                          dimless="-"),
-                                         sol["variables"][var]))
+import numpy as np
+from layercache import LayerCache
+from multigrid import prolong
+from solcache import SolutionCache
+from artifacts import ArtifactStore
+from gencsm import gencsm, csmdiff
+import mesh
+from time import time
+import os
+
+TEMPLATES = LayerCache()
+SOLUTIONS = SolutionCache()
+
+
+class Session(object):
+    "One client's warm-start history and output file namespace"
+    def __init__(self, outdir=".", maxartifacts=20):
+        self.outdir = outdir
+        self.ID = 0
+        self.lastsol = None  # (gridsize, solution, model)
+        self.lastcsm = None  # text of the last HX.csm written
+        self.artifacts = ArtifactStore(maxartifacts)
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir)
+
+    def path(self, filename):
+        return os.path.normpath(os.path.join(self.outdir, filename))
+
+
+SESSION = Session()
+
+
+def genfiles(m, sol, session=SESSION):
+    """Updates HX.csm for the viewer and keeps the solution as an artifact
+
+    HX.csm is only rewritten if it changed from the last one written.
+    Returns the viewer update: {"geometry": whether the layout (knots,
+    thicknesses) changed, so the viewer has to rebuild, "pmtrs": the
+    despmtr values that changed, "csm": the session's HX.csm}.
+    sol_%03i.txt, HX_%03i.csm and meshes are only written on request
+    (see save).
+    """
+    ID = session.ID
+    csm = gencsm(m, sol, ID, None)
+    pmtrs, layout = csmdiff(session.lastcsm, csm)
+    if layout or pmtrs:
+        with open(session.path("HX.csm"), "w") as f:
+            f.write(csm)
+        session.lastcsm = csm
+    session.artifacts.add(ID, m, sol, csm)
+    session.ID += 1
+    return {"geometry": layout, "pmtrs": pmtrs,
+            "csm": session.path("HX.csm")}
+
+
+def save(data, session=SESSION):
+    """Handles a {"type": "save"} request, returning the reply to send
+
+    Writes the artifact with the requested "id" (default: the latest) in
+    the background; "all" saves every artifact still in memory. With
+    "mesh": "stl" or "obj", each one's triangle mesh (see mesh.py) is
+    written too, as HX_%03i.stl or .obj. IDs are per session, so the
+    reply also names the session's directory.
+    """
+    IDs = session.artifacts.ids()
+    if not data.get("all"):
+        ID = data.get("id", IDs[-1] if IDs else None)
+        if ID not in IDs:
+            return {"status": "unknown", "msg": "That solution is no longer"
+                    " in memory."}
+        IDs = [ID]
+    meshformat = data.get("mesh")
+    if meshformat not in (None, "stl", "obj"):
+        return {"status": "unknown", "msg": "Meshes can be saved as stl"
+                " or obj, not %r." % meshformat}
+    for ID in IDs:
+        session.artifacts.save(ID, session.outdir)
+        if meshformat:
+            m, sol = session.artifacts.solution(ID)
+            mesh.export(m, sol, session.path("HX_%03i.%s" % (ID, meshformat)))
+    return {"status": "saved", "ids": IDs, "dir": session.outdir,
+            "msg": "Saving solution files %s in %s." % (
+                ", ".join("%03i" % ID for ID in IDs), session.outdir)}
+
+
+def estimate(m, sol, design_parameters):
+    """First-order prediction of Q and drags from sol's sensitivities
+
+    Uses the log-log constant sensitivities of the cost (1/Q). Returns
+    None if a changed parameter has no sensitivity in sol.
+    """
+    sens = sol["sensitivities"]["constants"]
+    dlogcost = 0.
+    for name, value in design_parameters.items():
+        if name in ("Cold_Channels", "Hot_Channels"):
+            continue
+        key = m.design_parameters.get(name)
+        if key is None:
+            continue
+        old = sol["variables"][key]
+        if value == old:
+            continue
+        try:
+            dlogcost += sens[key]*np.log(float(value)/old)
+        except KeyError:
+            return None
+    # drags are budgets, and the last solution saturates them
+    return {"Q": sol["variables"][m.Q]*np.exp(-dlogcost),
+            "D_hot": design_parameters.get("Hot_Drag",
+                                           sol["variables"][m.D_hot]),
+            "D_cold": design_parameters.get("Cold_Drag",
+                                            sol["variables"][m.D_cold])}
+
+
+def progress_reporter(send):
+    """Returns a gp_timer callback that sends a progress message per GP
+
+    Messages carry the SP iteration number, the current Q estimate, the
+    relative change in cost and the elapsed time.
+    """
+    iterations = []
+    start = time()
+
+    def report(entry):
+        iterations.append(entry)
+        cost = entry["cost"]
+        dcost = (abs(iterations[-2]["cost"] - cost)/cost
+                 if len(iterations) > 1 else None)
+        send({"status": "progress", "iteration": len(iterations),
+              "Q": 1/cost, "dcost": dcost, "elapsed": time() - start,
+              "msg": "SP iteration %i: heat transfer %.1f watts"
+                     % (len(iterations), 1/cost)})
+    return report
+
+
+def replies(data, session=SESSION, progress=None):
+    """Solves one design request, yielding each reply to send
+
+    An estimate (when the grid size is unchanged) comes first, then the
+    optimal solution or an error message. If given, progress is called
+    with a message dict after every SP iteration.
+    """
+    try:
+        Ncoldpipes = data["Cold_Channels"]
+        Nhotpipes = data["Hot_Channels"]
+        m = TEMPLATES.get(Ncoldpipes, Nhotpipes, data)
+        if session.lastsol is None:
+            x0 = None
+        else:
+            lastsize, lastsol, lastm = session.lastsol
+            if (Ncoldpipes, Nhotpipes) == lastsize:
+                x0 = lastsol["variables"]
+                guess = estimate(lastm, lastsol, data)
+                if guess is not None:
+                    guess.update(status="estimate",
+                                 msg=("Estimated heat transfer: %.1f watts;"
+                                      " optimizing..." % guess["Q"]))
+                    yield guess
+            else:
+                x0 = prolong(lastm, lastsol, m)
+
+        callback = progress_reporter(progress) if progress else None
+        sol = SOLUTIONS.localsolve(m, callback, x0=x0)
+        print "solution cache: %i hits, %i misses" % (SOLUTIONS.hits,
+                                                      SOLUTIONS.misses)
+        session.lastsol = ((Ncoldpipes, Nhotpipes), sol, m)
+        update = genfiles(m, sol, session)
+
+        update.update({"status": "optimal",
+                       "Q": sol["variables"][m.Q],
+                       "D_hot": sol["variables"][m.D_hot],
+                       "D_cold": sol["variables"][m.D_cold],
+                       "msg": ("Successfully optimized."
+                               " Optimal heat transfer: %.1f watts "
+                               % sol["variables"][m.Q])})
+        if not update["geometry"]:
+            update["msg"] += "(geometry unchanged) "
+        yield update
+    except Exception as e:
+        yield {"status": "unknown", "msg": "The last solution"
+               " raised an exception; tweak it and send again."}
+        print type(e), e
 
 
 class HXGPServer(WebSocket):
@@ -32,56 +191,58 @@ class HXGPServer(WebSocket):
         try:
             self.data = json.loads(self.data)
             print self.data
-
-            Ncoldpipes = self.data["Cold_Channels"]
-            Nhotpipes = self.data["Hot_Channels"]
-            if (Ncoldpipes, Nhotpipes) == LASTSOL[0][0]:
-                x0 = LASTSOL[0][1]["variables"]
-            else:
-                x0 = None
-
-            m = Layer(Ncoldpipes, Nhotpipes)
-            m.cost = 1/m.Q
-
-            for name, value in self.data.items():
-                try:
-                    key = m.design_parameters[name]
-                    m.substitutions[key] = value
-                except KeyError as e:
-                    print repr(e)
-
-            sol = m.localsolve(x0=x0)
-            LASTSOL[0] = ((Ncoldpipes, Nhotpipes), sol)
-            genfiles(m, sol)
-
-            self.send({"status": "optimal",
-                       "msg": ("Successfully optimized."
-                               " Optimal heat transfer: %.1f watts "
-                               % sol["variables"][m.Q])})
-        except Exception as e:
-            self.send({"status": "unknown", "msg": "The last solution"
-                      " raised an exception; tweak it and send again."})
+        except ValueError as e:
+            self.send({"status": "unknown", "msg": "The last message"
+                       " could not be parsed."})
             print type(e), e
+            return
+        kind = self.data.get("type")
+        if kind == "save":
+            self.send(save(self.data))
+        elif kind == "ping":
+            self.send({"status": "pong", "msg": "pong", "time": time()})
+        elif kind == "status":
+            # solves block the loop, so none is running between messages
+            self.send({"status": "idle",
+                       "msg": "No optimization in progress."})
+        elif kind == "cancel":
+            self.send({"status": "cancelled", "msg": "No optimization in"
+                       " progress; solves here can't be interrupted."})
+        elif kind is None:
+            for reply in replies(self.data, progress=self.send):
+                self.send(reply)
+        else:
+            self.send({"status": "unknown",
+                       "msg": "Unknown message type %r." % kind})
 
     def send(self, msg):
+        """Sends msg right away
+
+        sendMessage only queues it until the next serveonce(), which would
+        be after the solve for estimates and progress messages.
+        """
         print "> sent", repr(msg)
         self.sendMessage(unicode(json.dumps(msg)))
+        while self.sendq:
+            _, payload = self.sendq.popleft()
+            self._sendBuffer(payload, send_all=True)
 
     def handleConnected(self):
         print self.address, "connected"
 
     def handleClose(self):
         print self.address, "closed"
-        EXIT[0] = True
 
 
 if __name__ == "__main__":
-    m = Layer(3, 3)
-    m.cost = 1/m.Q
-    sol = m.localsolve()
-    LASTSOL[0] = ((3, 3), sol)
+    m = TEMPLATES.get(3, 3)
+    sol = SOLUTIONS.localsolve(m)
+    SESSION.lastsol = ((3, 3), sol, m)
     genfiles(m, sol)
     server = SimpleWebSocketServer('', 8000, HXGPServer)
-    while not EXIT[0]:
-        server.serveonce()
+    try:
+        while True:
+            server.serveonce()
+    except KeyboardInterrupt:
+        pass
     print "Python server has exited."
@@ -0,0 +1,215 @@
+"Content-addressed on-disk cache of Layer solutions"
+import os
+import tempfile
+from hashlib import sha1
+import numpy as np
+from gpkit import Variable, NomialArray
+from gpkit.keydict import KeyDict
+from gpkit.solution_array import SolutionArray
+from multigrid import values
+from profiling import gp_timer, solve_compiled
+
+
+def named_variables(m):
+    """Yields (canonical name, variable) for every variable of a Layer
+
+    Variables come from m's varkeys, so those declared outside a
+    docstring (e.g. RectangularPipe.l_cum) are included, each named after
+    the submodel that declared it.
+    """
+    paths = {}
+    for path, sub in [("", m), ("cells", m.cells),
+                      ("coldpipes", m.coldpipes), ("hotpipes", m.hotpipes),
+                      ("material", m.material),
+                      ("coldfluid", m.coldpipes.fluid),
+                      ("hotfluid", m.hotpipes.fluid)]:
+        paths[sub.naming] = path
+    elements = {}
+    for key in m.varkeys:
+        path = paths.get(key.naming, ".".join(key.naming[0]))
+        name = (path + "." if path else "") + key.name
+        elements.setdefault(name, []).append(key)
+    for name in sorted(elements):
+        keys = elements[name]
+        vk = keys[0].veckey
+        if vk is None:
+            yield name, Variable(newvariable=False, **keys[0].descr)
+            continue
+        var = NomialArray(np.full(vk.shape, np.nan, dtype="object"))
+        var.key = vk
+        for key in keys:
+            var[key.idx] = Variable(newvariable=False, **key.descr)
+        yield name, var
+
+
+def canonical(value):
+    "A stable string for a substitution value"
+    if hasattr(value, "magnitude"):
+        return "%s %s" % (canonical(value.magnitude), value.units)
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    return repr(value)
+
+
+def element_names(m):
+    "Maps every variable key of a Layer to its canonical (element) name"
+    names = {}
+    for name, var in named_variables(m):
+        if hasattr(var, "flat"):
+            for i, el in enumerate(var.flat):
+                names[el.key] = "%s[%i]" % (name, i)
+        else:
+            names[var.key] = name
+    return names
+
+
+def canonical_cost(m):
+    "A stable string for m's cost, independent of model numbering"
+    names = element_names(m)
+    terms = []
+    for c, exp in zip(m.cost.cs, m.cost.exps):
+        factors = sorted("%s^%r" % (names.get(key, key.name), x)
+                         for key, x in exp.items())
+        terms.append("%s*%s" % (canonical(c), "*".join(factors)))
+    return " + ".join(sorted(terms))
+
+
+def substituted(m, var):
+    "Returns m's substitution for var (elementwise for arrays), or None"
+    els = var.flat if hasattr(var, "flat") else [var]
+    subs = []
+    for el in els:
+        try:
+            subs.append(m.substitutions[el.key])
+        except KeyError:
+            subs.append(None)
+    return subs
+
+
+class SolutionCache(object):
+    """Stores final solution variables keyed by a hash of the problem
+
+    The hash covers the model class and its formulation flags, grid size,
+    cost, every substitution and the localsolve settings. Only cold solves
+    are cached: this SP's local optimum can depend on the initial guess,
+    so solves given an x0 bypass the cache. Entries are compressed .npz
+    files in cachedir; the least recently used are removed once the
+    directory holds more than maxbytes. The directory may be shared
+    between processes.
+    """
+    def __init__(self, cachedir=".hxcache", maxbytes=200e6):
+        self.cachedir = cachedir
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+
+    def digest(self, m, **solveargs):
+        "Canonical hash of a model's structure, substitutions and settings"
+        h = sha1()
+        h.update("%s.%s %i %i\n" % (type(m).__module__, type(m).__name__,
+                                    m.Ncoldpipes, m.Nhotpipes))
+        for flag in ("cumulative_lengths", "merge_aliases"):
+            h.update("%s=%r\n" % (flag, getattr(m, flag, None)))
+        h.update("cost=%s\n" % canonical_cost(m))
+        for name, var in named_variables(m):
+            h.update("%s=%s\n" % (name, canonical(substituted(m, var))))
+        for arg in sorted(solveargs):
+            if arg != "x0":  # None: only cold solves are cached
+                h.update("%s:%s\n" % (arg, canonical(solveargs[arg])))
+        return h.hexdigest()
+
+    def path(self, digest):
+        return os.path.join(self.cachedir, digest + ".npz")
+
+    def load(self, m, digest):
+        "Returns a SolutionArray for m from the cache, or None"
+        path = self.path(digest)
+        try:
+            data = np.load(path)
+        except IOError:  # not cached, or just evicted by another process
+            return None
+        variables, sensitivities = KeyDict(), KeyDict()
+        with data:
+            for name, var in named_variables(m):
+                for store, prefix in [(variables, "v:"),
+                                      (sensitivities, "s:")]:
+                    if prefix + name not in data.files:
+                        continue
+                    vals = data[prefix + name]
+                    els = var.flat if hasattr(var, "flat") else [var]
+                    for el, val in zip(els, np.ravel(vals)):
+                        store[el.key] = val
+            cost = float(data["cost"])
+        sol = SolutionArray()
+        sol["cost"] = cost
+        sol["variables"] = variables
+        sol["freevariables"] = KeyDict((k, v) for k, v in variables.items()
+                                       if k not in m.substitutions)
+        sol["constants"] = KeyDict((k, v) for k, v in variables.items()
+                                   if k in m.substitutions)
+        sol["sensitivities"] = {"constants": sensitivities}
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return sol
+
+    def store(self, m, sol, digest):
+        "Writes the solution variables and constant sensitivities to disk"
+        arrays = {"cost": np.array(sol["cost"])}
+        sens = sol["sensitivities"]["constants"]
+        for name, var in named_variables(m):
+            for prefix, source in [("v:", sol), ("s:", {"variables": sens})]:
+                x = values(source, var)
+                if x is not None:
+                    arrays[prefix + name] = x
+        # unique, so concurrent writers (e.g. server workers) can't collide
+        fd, tmppath = tempfile.mkstemp(suffix=".tmp", dir=self.cachedir)
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.rename(tmppath, self.path(digest))
+        self.evict()
+
+    def evict(self):
+        "Removes least recently used entries until under maxbytes"
+        entries = []
+        for fname in os.listdir(self.cachedir):
+            if fname.endswith(".npz"):
+                path = os.path.join(self.cachedir, fname)
+                try:
+                    stat = os.stat(path)
+                except OSError:  # removed by another process's evict
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while entries and total > self.maxbytes:
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def localsolve(self, m, callback=None, **solveargs):
+        """Returns a cached solution of m if one exists, else solves and
+        stores it; callback is then passed to profiling.gp_timer
+
+        Warm starts (an x0 in solveargs) are solved without the cache.
+        """
+        cold = solveargs.get("x0") is None
+        if cold:
+            digest = self.digest(m, **solveargs)
+            sol = self.load(m, digest)
+            if sol is not None:
+                self.hits += 1
+                return sol
+            self.misses += 1
+        program = m.sp()
+        with gp_timer(program, [], callback):
+            sol = solve_compiled(m, program, **solveargs)
+        if cold:
+            self.store(m, sol, digest)
+        return sol
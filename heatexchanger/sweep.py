@@ -0,0 +1,138 @@
+"Parallel parameter sweeps over Layer.design_parameters"
+import csv
+import signal
+import itertools
+from math import ceil
+from time import time
+from multiprocessing import Pool
+from layercache import LayerCache
+from archive import columns as solution_columns
+
+# Layer variables reported for every sweep point
+OUTPUTS = ["Q", "D_hot", "D_cold", "solidity"]
+CACHE = [None]  # this worker process's LayerCache
+ARCHIVE_BATCH = 100  # solutions buffered per grid size between appends
+
+
+class SolveTimeout(Exception):
+    "Raised in a worker when a sweep point exceeds its time budget"
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise SolveTimeout("solve exceeded its time limit")
+
+
+def grid(**ranges):
+    """Returns the cartesian product of design-parameter ranges
+
+    e.g. grid(Ti_hotfluid=[400, 500], vi_coldfluid=[10, 20, 30])
+    gives six substitution dicts.
+    """
+    names = sorted(ranges)
+    return [dict(zip(names, values))
+            for values in itertools.product(*[ranges[n] for n in names])]
+
+
+def init_worker(maxbytes):
+    "Gives each worker process its own cache of built Layers"
+    CACHE[0] = LayerCache(maxbytes)
+
+
+def solve_point(task):
+    """Solves one sweep point in a worker; returns a result row dict
+
+    status is "optimal", "timeout", or the exception raised by localsolve
+    (e.g. an infeasibility or SP non-convergence). With archiving on, the
+    row's "columns" holds (grid size, archive.columns of the solution).
+    """
+    index, params, gridsize, timeout, archive, solveargs = task
+    if CACHE[0] is None:
+        init_worker(500e6)
+    row = dict(params)
+    row.update(index=index, status="optimal", iterations=None)
+    start = time()
+    if timeout:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(int(ceil(timeout)))
+    try:
+        Ncoldpipes = params.get("Cold_Channels", gridsize[0])
+        Nhotpipes = params.get("Hot_Channels", gridsize[1])
+        m = CACHE[0].get(Ncoldpipes, Nhotpipes, params)
+        sol = m.localsolve(**solveargs)
+        for name in OUTPUTS:
+            row[name] = sol["variables"][getattr(m, name)]
+        row["iterations"] = len(sol.program.gps)
+        if archive:
+            row["columns"] = ((Ncoldpipes, Nhotpipes),
+                              solution_columns(m, sol))
+    except SolveTimeout:
+        row["status"] = "timeout"
+    except Exception as e:
+        row["status"] = "%s: %s" % (type(e).__name__, e)
+    finally:
+        if timeout:
+            signal.alarm(0)
+    row["solve_time"] = time() - start
+    return row
+
+
+def sweep(points, Ncoldpipes=3, Nhotpipes=3, processes=None, timeout=None,
+          outfile=None, maxbytes=500e6, archive=None, **solveargs):
+    """Solves a list of design-parameter dicts in a process pool
+
+    Arguments
+    ---------
+    points : list of dicts
+        each maps names in Layer.design_parameters to values; include
+        Cold_Channels / Hot_Channels to vary the grid size
+    Ncoldpipes, Nhotpipes : int
+        grid size for points that don't specify one
+    processes : int
+        worker count (defaults to the number of CPUs)
+    timeout : float
+        per-point time limit in seconds
+    outfile : str
+        if given, rows are appended to this CSV as they finish
+    archive : archive.SolutionArchive
+        if given, every optimal solution is appended to it
+
+    Yields result rows (dicts) in order of completion.
+    """
+    solveargs.setdefault("verbosity", 0)
+    names = sorted(set(name for p in points for name in p))
+    columns = (["index"] + names + OUTPUTS
+               + ["status", "iterations", "solve_time"])
+    tasks = [(i, p, (Ncoldpipes, Nhotpipes), timeout, archive is not None,
+              solveargs) for i, p in enumerate(points)]
+    pool = Pool(processes, init_worker, (maxbytes,))
+    f = open(outfile, "w") if outfile else None
+    buffered = {}  # grid size -> solution columns awaiting archiving
+    try:
+        if f:
+            writer = csv.DictWriter(f, columns, restval="")
+            writer.writeheader()
+        for row in pool.imap_unordered(solve_point, tasks):
+            if "columns" in row:
+                gridsize, cols = row.pop("columns")
+                buffered.setdefault(gridsize, []).append(cols)
+                if len(buffered[gridsize]) >= ARCHIVE_BATCH:
+                    archive.append(gridsize, buffered.pop(gridsize))
+            if f:
+                writer.writerow(row)
+                f.flush()
+            yield row
+        pool.close()
+    finally:
+        pool.terminate()
+        if f:
+            f.close()
+        for gridsize, rows in buffered.items():
+            archive.append(gridsize, rows)
+
+
+if __name__ == "__main__":
+    POINTS = grid(Ti_hotfluid=[350, 400, 450, 500],
+                  vi_coldfluid=[10, 20, 30])
+    for ROW in sweep(POINTS, outfile="sweep.csv", timeout=120):
+        print ROW["index"], ROW["status"], ROW.get("Q")
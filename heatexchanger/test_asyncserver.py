@@ -0,0 +1,62 @@
+"""Non-blocking server tests (without a websocket)
+
+Run from heatexchanger/: python -m pytest test_asyncserver.py
+"""
+import unittest
+import shutil
+import tempfile
+from time import time, sleep
+import asyncserver
+from asyncserver import Worker, CLIENTS, WORKERS, collect
+
+
+class Client(object):
+    "Stands in for a connection, keeping what is sent to it"
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+
+def wait_reply(client, timeout=30):
+    "Forwards worker replies until client gets one"
+    start = time()
+    while not client.sent and time() - start < timeout:
+        collect()
+        sleep(0.01)
+    return client.sent.pop(0)
+
+
+class TestWorkers(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        WORKERS[:] = [Worker(self.outdir)]
+        self.client = Client()
+        CLIENTS[self.client] = {"sid": 1, "latest": 1}
+
+    def tearDown(self):
+        for worker in WORKERS:
+            worker.stop()
+        del WORKERS[:]
+        CLIENTS.clear()
+        shutil.rmtree(self.outdir)
+
+    def test_respawn(self):
+        worker = WORKERS[0]
+        worker.submit(self.client, 1, 1, {"type": "save"})
+        self.assertEqual(wait_reply(self.client)["status"], "unknown")
+        worker.process.terminate()  # e.g. killed for memory
+        worker.process.join()
+        worker.submit(self.client, 1, 1, {"type": "save"})
+        reply = wait_reply(self.client)
+        self.assertIn("failed", reply["msg"])
+        self.assertTrue(worker.process.is_alive())
+        self.assertIsNone(worker.job)
+        # the new process serves the session
+        worker.submit(self.client, 1, 1, {"type": "save"})
+        self.assertIn("no longer", wait_reply(self.client)["msg"])
+
+
+if __name__ == "__main__":
+    unittest.main()
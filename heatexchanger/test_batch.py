@@ -0,0 +1,47 @@
+"""BatchSolver tests
+
+Run from heatexchanger/: python -m pytest test_batch.py
+"""
+import unittest
+import numpy as np
+from gpkit.constraints.sgp import SequentialGeometricProgram
+from layer import Layer
+from batch import BatchSolver
+from sweep import OUTPUTS
+
+NAMES = ["Ti_hotfluid", "vi_coldfluid"]
+X = np.array([[450, 15], [480, 25]])
+
+
+def individual(row):
+    "Outputs of a fresh Layer solved at one row of X"
+    m = Layer(2, 2)
+    m.cost = 1/m.Q
+    for name, value in zip(NAMES, row):
+        m.substitutions[m.design_parameters[name]] = value
+    sol = m.localsolve(verbosity=0)
+    return [sol["variables"][getattr(m, name)] for name in OUTPUTS]
+
+
+class TestBatchSolver(unittest.TestCase):
+    def test_matches_localsolve(self):
+        m = Layer(2, 2)
+        m.cost = 1/m.Q
+        # the program is compiled once, not per row
+        init_gp = SequentialGeometricProgram.init_gp
+        calls = []
+        SequentialGeometricProgram.init_gp = \
+            lambda *args: calls.append(1) or init_gp(*args)
+        try:
+            # without warm starts every row, the first included, is solved
+            # from the same initial guess as an individual localsolve
+            outputs, _ = BatchSolver(m, NAMES).solve(X, warmstart=False)
+        finally:
+            SequentialGeometricProgram.init_gp = init_gp
+        self.assertEqual(len(calls), 1)
+        for row, output in zip(X, outputs):
+            np.testing.assert_allclose(output, individual(row), rtol=1e-3)
+
+
+if __name__ == "__main__":
+    unittest.main()
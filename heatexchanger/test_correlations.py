@@ -0,0 +1,25 @@
+"""Correlation fit tests
+
+Run from heatexchanger/: python -m pytest test_correlations.py
+"""
+import unittest
+from gpkit import Variable
+import correlations
+
+RE = [2e4, 5e4, 9e4, 2e5]
+
+
+class TestCorrelations(unittest.TestCase):
+    def test_normalization(self):
+        # the GP constraints and value() agree at the fit's own x_ref, y_ref
+        Re, y = Variable("Re"), Variable("y")
+        for name in correlations.FITS:
+            for x in RE:
+                subs = {Re: x, y: correlations.value(name, x)}
+                p = max(cstrt.as_posyslt1()[0].sub(subs).value
+                        for cstrt in correlations.constraints(name, Re, y))
+                self.assertAlmostEqual(p, 1, places=6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Smoke tests: small Layers build (verifying their docstrings) and solve
+
+Run from heatexchanger/: python -m pytest test_layer.py
+"""
+import unittest
+import numpy as np
+import correlations
+from layer import Layer
+from layercache import LayerCache
+
+
+def solve_layer(N=2, **flags):
+    "Builds and solves an NxN Layer maximizing Q, with Layer flags set"
+    defaults = dict((name, getattr(Layer, name)) for name in flags)
+    for name, value in flags.items():
+        setattr(Layer, name, value)
+    try:
+        m = Layer(N, N)
+    finally:
+        for name, value in defaults.items():
+            setattr(Layer, name, value)
+    m.cost = 1/m.Q
+    return m, m.localsolve(verbosity=0)
+
+
+class TestLayer(unittest.TestCase):
+    def test_default(self):
+        m, sol = solve_layer()
+        self.assertAlmostEqual(sol["variables"][m.Q], 430.0, delta=1)
+        # the pipes' fits are correlations.py's, at its normalization
+        for pipes in (m.hotpipes, m.coldpipes):
+            Re = sol["variables"][pipes.Re][-1]
+            for name in ("eta_h", "Pf"):
+                self.assertTrue(np.allclose(
+                    sol["variables"][getattr(pipes, name)],
+                    correlations.value(name, Re), rtol=1e-4))
+
+    def test_cumulative_lengths(self):
+        # a different local optimum than the partial sums (RectangularPipe)
+        m, sol = solve_layer(cumulative_lengths=True)
+        self.assertTrue(hasattr(m.hotpipes, "l_cum"))
+        self.assertTrue(0 < sol["variables"][m.Q] < 440)
+        self.assertFalse(hasattr(Layer(2, 2).hotpipes, "l_cum"))
+
+    def test_merge_aliases(self):
+        m, sol = solve_layer(merge_aliases=True)
+        self.assertIs(m.cells.dQ, m.hotpipes.dQ)
+        self.assertAlmostEqual(sol["variables"][m.Q], 430.0, delta=1)
+
+    def test_presolve(self):
+        # the same optimum, with fewer variables in every GP
+        cache = LayerCache(presolve=True)
+        m = cache.get(2, 2)
+        self.assertTrue(cache.presolved["substituted"] > 0)
+        sol = m.localsolve(verbosity=0)
+        self.assertAlmostEqual(sol["variables"][m.Q], 430.0, delta=1)
+        m = cache.get(2, 2, {"Ti_hotfluid": 450})
+        self.assertEqual(m.substitutions[m.design_parameters["Ti_hotfluid"]],
+                         450)
+
+
+if __name__ == "__main__":
+    unittest.main()
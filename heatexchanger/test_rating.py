@@ -0,0 +1,42 @@
+"""Forward rating tests: against the Layer that was solved
+
+Run from heatexchanger/: python -m pytest test_rating.py
+"""
+import unittest
+import numpy as np
+from layer import Layer
+from rating import geometry, operating_point, rate
+from uncertainty import propagate
+
+
+class TestRating(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.m = Layer(2, 2)
+        cls.m.cost = 1/cls.m.Q
+        cls.sol = cls.m.localsolve(verbosity=0)
+        cls.geom = geometry(cls.m, cls.sol)
+        cls.op = operating_point(cls.m, cls.sol)
+
+    def test_design_point(self):
+        out = rate(self.geom, **self.op)
+        var = self.sol["variables"]
+        self.assertAlmostEqual(out["Q"][0]/var[self.m.Q], 1, delta=0.02)
+        self.assertAlmostEqual(out["D_hot"][0]/var[self.m.D_hot], 1,
+                               places=3)
+        self.assertAlmostEqual(out["D_cold"][0]/var[self.m.D_cold], 1,
+                               places=3)
+
+    def test_points(self):
+        # arrays of operating points rate as each one alone
+        op = dict(self.op, T_in_hot=np.array([400, 500]))
+        Q = rate(self.geom, **op)["Q"]
+        self.assertAlmostEqual(Q[1], rate(self.geom, **self.op)["Q"][0])
+        self.assertTrue(Q[0] < Q[1])
+        summary, _ = propagate(self.geom, self.op, nsamples=1000,
+                               processes=1, seed=0)
+        self.assertAlmostEqual(summary["Q"][50]/Q[1], 1, delta=0.02)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""Solution cache tests
+
+Run from heatexchanger/: python -m pytest test_solcache.py
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from layer import Layer
+from solcache import SolutionCache
+
+
+class TestSolutionCache(unittest.TestCase):
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.cache = SolutionCache(self.cachedir)
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def test_roundtrip(self):
+        # every variable comes back, including non-docstring ones
+        Layer.cumulative_lengths = True
+        try:
+            m = Layer(2, 2)
+        finally:
+            Layer.cumulative_lengths = False
+        m.cost = 1/m.Q
+        sol = self.cache.localsolve(m, verbosity=0)
+        cached = self.cache.localsolve(m, verbosity=0)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        for var in (m.Q, m.hotpipes.l_cum, m.coldpipes.l_cum):
+            self.assertTrue(np.allclose(cached(var), sol(var)))
+        # warm starts are solved, not looked up
+        self.cache.localsolve(m, verbosity=0, x0=sol["variables"])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_evict_shared(self):
+        # entries another process removes meanwhile are skipped
+        self.cache.maxbytes = 0
+        for name in ("a", "b"):
+            with open(self.cache.path(name), "w") as f:
+                f.write("x")
+        listdir = os.listdir
+        os.listdir = lambda path: listdir(path) + ["gone.npz"]
+        try:
+            self.cache.evict()
+        finally:
+            os.listdir = listdir
+        self.assertEqual(os.listdir(self.cachedir), [])
+        self.assertIsNone(self.cache.load(Layer(2, 2), "a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"Monte Carlo propagation of property uncertainty through a fixed design"
+from multiprocessing import Pool
+import numpy as np
+from scipy.special import ndtri
+from rating import rate
+
+# relative (lognormal) standard deviations of the uncertain inputs;
+# t_min is applied as a tolerance on the design's fin thicknesses
+UNCERTAINTY = {"rho_cold": 0.02, "c_cold": 0.01, "mu_cold": 0.03,
+               "k_cold": 0.03, "rho_hot": 0.01, "c_hot": 0.01,
+               "mu_hot": 0.05, "k_hot": 0.03, "k_metal": 0.05,
+               "t_min": 0.05, "eta_h_factor": 0.02, "Pf_factor": 0.10,
+               "Re_factor": 0.05}
+OUTPUTS = ["Q", "D_hot", "D_cold"]
+
+
+def latin_hypercube(nsamples, ndims, rng):
+    "Stratified uniform samples in [0, 1)^ndims, one per row stratum"
+    u = (np.arange(nsamples)[:, np.newaxis]
+         + rng.rand(nsamples, ndims))/nsamples
+    for k in range(ndims):
+        u[:, k] = u[rng.permutation(nsamples), k]
+    return u
+
+
+def sample(geom, op, uncertainty, nsamples, method="lhs", seed=None):
+    """Draws lognormal samples of the uncertain inputs around op and geom
+
+    method is "lhs" (Latin hypercube) or "random". Returns (geom, op)
+    with sampled entries replaced by arrays of nsamples values.
+    """
+    rng = np.random.RandomState(seed)
+    names = sorted(uncertainty)
+    if method == "lhs":
+        u = latin_hypercube(nsamples, len(names), rng)
+    else:
+        u = rng.rand(nsamples, len(names))
+    scale = np.exp(ndtri(u)*np.array([uncertainty[n] for n in names]))
+    geom, op = dict(geom), dict(op)
+    for k, name in enumerate(names):
+        if name == "t_min":
+            for t in ("t_hot", "t_cld"):
+                geom[t] = geom[t]*scale[:, k, np.newaxis, np.newaxis]
+        else:
+            op[name] = op[name]*scale[:, k]
+    return geom, op
+
+
+def chunk(d, nsamples, s):
+    "Slices the per-sample entries of d"
+    return dict((k, v[s] if np.ndim(v) and np.shape(v)[0] == nsamples
+                 and np.ndim(v) != 2 else v) for k, v in d.items())
+
+
+def rate_chunk(args):
+    "Rates one chunk of samples in a worker process"
+    geom, op = args
+    out = rate(geom, **op)
+    return dict((name, out[name]) for name in OUTPUTS)
+
+
+def propagate(geom, op, uncertainty=None, nsamples=10000, method="lhs",
+              processes=None, chunksize=2500, percentiles=(5, 50, 95),
+              seed=None):
+    """Samples the uncertain inputs and rates every sample of the design
+
+    geom and op are as from rating.geometry and rating.operating_point.
+    Chunks of samples are rated in a process pool. Returns (summary,
+    samples): summary maps each output to {percentile: value}, samples
+    maps each output to its array of nsamples values.
+    """
+    if uncertainty is None:
+        uncertainty = UNCERTAINTY
+    geom, op = sample(geom, op, uncertainty, nsamples, method, seed)
+    tasks = [(chunk(geom, nsamples, slice(i, i + chunksize)),
+              chunk(op, nsamples, slice(i, i + chunksize)))
+             for i in range(0, nsamples, chunksize)]
+    if processes == 1 or len(tasks) == 1:
+        results = [rate_chunk(task) for task in tasks]
+    else:
+        pool = Pool(processes)
+        try:
+            results = pool.map(rate_chunk, tasks)
+        finally:
+            pool.terminate()
+    samples = dict((name, np.concatenate([r[name] for r in results]))
+                   for name in OUTPUTS)
+    summary = dict((name, dict(zip(percentiles,
+                                   np.percentile(samples[name],
+                                                 percentiles))))
+                   for name in OUTPUTS)
+    return summary, samples
+
+
+if __name__ == "__main__":
+    from time import time
+    from layer import Layer
+    from rating import geometry, operating_point
+    M = Layer(4, 4)
+    M.cost = 1/M.Q
+    SOL = M.localsolve(verbosity=0)
+    START = time()
+    SUMMARY, _ = propagate(geometry(M, SOL), operating_point(M, SOL),
+                           nsamples=20000, seed=0)
+    print "20000 samples in %.2fs" % (time() - START)
+    for NAME in OUTPUTS:
+        print "%-7s" % NAME, "  ".join("p%i %.4g" % (p, v) for p, v
+                                       in sorted(SUMMARY[NAME].items()))